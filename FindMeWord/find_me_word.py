@@ -24,10 +24,31 @@
     @Version: The 0-th naive version
 """
 
+import argparse
+import bisect
+import heapq
+import itertools
+import multiprocessing
 import os
-from collections import defaultdict
+import sys
+from array import array
+
+try:
+    import numpy as np # optional: vectorized scoring of candidate lists
+except ImportError:
+    np = None
+
+import ngram_store
 
 DATAFOLDER = "./data"
+UNIGRAM_FILE = os.path.join(DATAFOLDER, "count_1w.txt")
+BIGRAM_FILE = os.path.join(DATAFOLDER, "count_2w.txt")
+MODEL_FILE = os.path.join(DATAFOLDER, "ngrams.bin") # compiled counts, see ngram_store.py
+ADJECTIVE_FILE = os.path.join(DATAFOLDER, "adjectives", "28K_adjectives.txt")
+N_TOKENS = 1024908267229 # total number of tokens in the corpus
+# typed array of packed bigram keys: 64-bit unsigned longs if the platform has them,
+# else doubles (exact up to 2**53)
+KEY_TYPE = "L" if array("L").itemsize >= 8 else "d"
 
 ## Utilities
 def gen_data(fname, sep="\t"):
@@ -44,87 +65,416 @@ def handle_unk_long_words(w, total):
     return 10./(total * 10**len(w))
     
 
+class Vocabulary(object):
+    """ Interned words with dense integer ids, in order of first appearance.
+        The words are kept in one byte string with an offsets array and found
+        through an open-addressing table of ids: a few bytes per word instead
+        of a dict entry, a string and an int object.
+    """
+    
+    def __init__(self):
+        self.strings = bytearray()
+        self.offsets = array("I", [0])
+        self.hashes = array("l") # hash of each word, to skip most string comparisons
+        self.table = array("i", [-1]) * 8
+        self.mask = 7
+        
+    def __len__(self):
+        return len(self.hashes)
+        
+    def _slot(self, w, hw):
+        """ Table slot of word w (hash hw): the one holding its id, or the empty one it would take."""
+        
+        table, hashes, mask = self.table, self.hashes, self.mask
+        h = hw & mask
+        while True:
+            i = table[h]
+            if i < 0 or (hashes[i] == hw and self.strings[self.offsets[i]:self.offsets[i + 1]] == w):
+                return h
+            h = (h + 1) & mask
+            
+    def _grow(self):
+        """ Double the table, keeping the load factor at most 1/2."""
+        
+        table = array("i", [-1]) * (2 * len(self.table))
+        mask = len(table) - 1
+        for i, hw in enumerate(self.hashes):
+            h = hw & mask
+            while table[h] >= 0:
+                h = (h + 1) & mask
+            table[h] = i
+        self.table, self.mask = table, mask
+        
+    def add(self, w):
+        """ Id of word w, giving it a new one if needed."""
+        
+        # _slot() inlined: this runs for every word of the corpus files
+        hw = hash(w)
+        table, hashes, mask = self.table, self.hashes, self.mask
+        h = hw & mask
+        while True:
+            i = table[h]
+            if i < 0:
+                break
+            if hashes[i] == hw and self.strings[self.offsets[i]:self.offsets[i + 1]] == w:
+                return i
+            h = (h + 1) & mask
+        i = table[h] = len(hashes)
+        hashes.append(hw)
+        self.strings += w
+        self.offsets.append(len(self.strings))
+        if 2 * len(hashes) > len(table):
+            self._grow()
+        return i
+        
+    def word(self, i):
+        """ The word with id i."""
+        return str(self.strings[self.offsets[i]:self.offsets[i + 1]])
+        
+    def get(self, w):
+        """ Id of word w, None if unknown."""
+        
+        i = self.table[self._slot(w, hash(w))]
+        if i < 0:
+            return None
+        return i
+
 class WordDist(object):
-    """ Simple language model that estimates the probability of a word based on its count.""" 
+    """ Simple language model that estimates the probability of a word based on its count.
+        Counts are kept in a typed array indexed by the word ids of a Vocabulary
+        (doubles: exact up to 2**53, and only used in float divisions).
+        A word with count 0 counts as unknown.
+    """ 
     
-    def __init__(self, data, total=None, handle_missing=None):
+    def __init__(self, data, total=None, handle_missing=None, vocab=None):
         
-        self.wcount = defaultdict(int)
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.counts = counts = array("d")
+        add = self.vocab.add
         for k, v in data:
-            self.wcount[k] += int(v)
+            i = add(k)
+            while len(counts) <= i:
+                counts.append(0.)
+            counts[i] += int(v)
         
         if total == None:
-            self.total = float(sum(self.wcount.itervalues()))
+            self.total = float(sum(self.counts))
         else:
             self.total = float(total) 
             
         self.handle_missing = handle_missing or (lambda k, total: 1./total)
         
+    def count_id(self, i):
+        """ Count of the word with id i (None or a word seen elsewhere only: 0)."""
+        
+        if i is None or i >= len(self.counts):
+            return 0.
+        return self.counts[i]
+        
+    def count(self, w):
+        """ Count of the given word w."""
+        return self.count_id(self.vocab.get(w))
+        
     def prob(self, w):
         """ Estimate the probability of the given word w."""
         
-        if w in self.wcount:
-            return self.wcount[w] / self.total
+        c = self.count(w)
+        if c:
+            return c / self.total
         else:
             return self.handle_missing(w, self.total)
         
+def _sort_bigrams(keys, counts, nwords):
+    """ Sort packed bigram keys, with their counts along, and add up the counts
+        of repeated keys, using arrays only (no list or dict of all the keys):
+        a counting sort on the prev id, then a sort within each prev id.
+        
+        Returns:
+            (keys, counts) as new arrays.
+    """
+    
+    starts = array("I", [0]) * (nwords + 1) # starts[p]: first position of prev id p
+    for key in keys:
+        starts[int(key) >> ngram_store.ID_BITS] += 1
+    total = 0
+    for p in xrange(nwords + 1):
+        starts[p], total = total, total + starts[p]
+    fill = array("I", starts)
+    skeys = array(keys.typecode, [0]) * len(keys)
+    scounts = array("d", [0.]) * len(keys)
+    for key, c in itertools.izip(keys, counts):
+        p = int(key) >> ngram_store.ID_BITS
+        skeys[fill[p]] = key
+        scounts[fill[p]] = c
+        fill[p] += 1
+        
+    n = 0 # keys written back so far, never ahead of the group being read
+    for p in xrange(nwords):
+        start, end = starts[p], starts[p + 1]
+        if end - start > 1:
+            group = sorted(itertools.izip(skeys[start:end], scounts[start:end]))
+        else:
+            group = itertools.izip(skeys[start:end], scounts[start:end])
+        for key, c in group:
+            if n and skeys[n - 1] == key:
+                scounts[n - 1] += c
+            else:
+                skeys[n] = key
+                scounts[n] = c
+                n += 1
+    del skeys[n:]
+    del scounts[n:]
+    return skeys, scounts
+    
+class BigramDist(object):
+    """ Counts of bigrams "prev word", keyed by packed word ids
+        (prev id << ngram_store.ID_BITS | word id) in a sorted array of keys,
+        with a parallel array of counts. Keys are 64-bit unsigned longs where
+        those are 64 bits (Linux, Mac OS X); elsewhere (Windows) doubles, exact
+        while there are fewer than 2**(53 - ID_BITS) words.
+    """
+    
+    def __init__(self, data, vocab):
+        
+        self.vocab = vocab
+        keys, counts = array(KEY_TYPE), array("d")
+        add, bits = vocab.add, ngram_store.ID_BITS
+        for k, v in data:
+            prev, word = k.split(" ", 1)
+            keys.append((add(prev) << bits) | add(word))
+            counts.append(int(v))
+        if KEY_TYPE == "d" and len(vocab) >= 1 << (53 - ngram_store.ID_BITS):
+            raise ValueError("too many words for bigram keys stored as doubles: %s" % len(vocab))
+        self.keys, self.counts = _sort_bigrams(keys, counts, len(vocab))
+        
+    def __len__(self):
+        return len(self.keys)
+        
+    def count_ids(self, i, j):
+        """ Count of the bigram of word ids (i, j) (0 if unknown)."""
+        
+        if i is None or j is None:
+            return 0.
+        key = (i << ngram_store.ID_BITS) | j
+        n = bisect.bisect_left(self.keys, key)
+        if n < len(self.keys) and self.keys[n] == key:
+            return self.counts[n]
+        return 0.
+        
+    def count(self, prev, word):
+        """ Count of the bigram "prev word"."""
+        return self.count_ids(self.vocab.get(prev), self.vocab.get(word))
+        
 class SimpleModel(object):
-    """ Simple language model consisting of unigram and bigram distributions."""
+    """ Simple language model consisting of unigram and bigram distributions
+        over one vocabulary of word ids.
+    """
     
     def __init__(self, ufile, bfile, n_tokens=None):
         
         if n_tokens == None:
-            self.n_tokens = 1024908267229 # total number of tokens in the corpus
+            self.n_tokens = N_TOKENS
         else:
             self.n_tokens = n_tokens
             
-        self.unigram_dist = WordDist(gen_data(ufile), self.n_tokens, handle_unk_long_words)
-        self.bigram_dist = WordDist(gen_data(bfile), self.n_tokens, handle_unk_long_words)
+        self.vocab = Vocabulary()
+        self.unigram_dist = WordDist(gen_data(ufile), self.n_tokens, handle_unk_long_words, self.vocab)
+        self.bigram_dist = BigramDist(gen_data(bfile), self.vocab)
         
     def cond_prob(self, word, prev):
         """ Estimate the conditional probability of a word, given previous word.
             If not found bigram prev-word then falling back to unigram word. 
         """
-        bigram = " ".join((prev, word))
-        if (bigram in self.bigram_dist.wcount) and (prev in self.unigram_dist.wcount):
-            return self.bigram_dist.wcount[bigram] / float(self.unigram_dist.wcount[prev])
+        i = self.vocab.get(prev)
+        b = self.bigram_dist.count_ids(i, self.vocab.get(word))
+        u = self.unigram_dist.count_id(i)
+        if b and u:
+            return b / u
         else:
             return self.unigram_dist.prob(word)
             
-def get_model(ufname="count_1w.txt", bfname="count_2w.txt"):
-    """ Return a count-based language model from given corpus files."""
+def _top_k(scores, k):
+    """ Indices of the k largest scores, best first, ties in index order (the
+        order of sorted(..., reverse=True)[:k]), found with argpartition
+        instead of a full sort.
+    """
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= len(scores):
+        return np.argsort(-scores, kind="mergesort")
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]] # the k-th largest score
+    above = np.flatnonzero(scores > kth)
+    idx = np.concatenate((above, np.flatnonzero(scores == kth)[:k - len(above)]))
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+class CandidateScorer(object):
+    """ cond_prob(word, prev) of a SimpleModel for every prev of a fixed list of
+        candidates at once, with NumPy. The ids and unigram counts of the
+        candidates are gathered once; then a query is one searchsorted of their
+        bigram keys over the model's sorted key array, a division, and an
+        argpartition for the top k.
+        
+        Params:
+            m_Model: a SimpleModel.
+            candidates: list of previous words to score.
+    """
     
+    def __init__(self, m_Model, candidates):
+        
+        self.model = m_Model
+        self.candidates = candidates
+        bigrams = m_Model.bigram_dist
+        self.keys = np.frombuffer(bigrams.keys, dtype=bigrams.keys.typecode)
+        self.bcounts = np.frombuffer(bigrams.counts, dtype=bigrams.counts.typecode)
+        counts = m_Model.unigram_dist.counts
+        ids = np.array([m_Model.vocab.get(a) for a in candidates], dtype=object)
+        known = np.array([i is not None and i < len(counts) for i in ids], dtype=bool)
+        ids = np.where(known, ids, 0).astype(np.intp)
+        ucounts = np.where(known, np.frombuffer(counts, dtype=counts.typecode)[ids], 0.)
+        # only candidates with a unigram count can score from a bigram, the others
+        # always get the fallback; keep the former in id order, so that their
+        # keys are sorted and searchsorted walks the key array once
+        rows = np.flatnonzero(ucounts > 0)
+        self.rows = rows[np.argsort(ids[rows], kind="mergesort")]
+        self.ucounts = ucounts[self.rows]
+        # prev id << ID_BITS, as a multiplication so that it also works for float keys
+        self.prev_keys = ids[self.rows].astype(self.keys.dtype) * self.keys.dtype.type(1 << ngram_store.ID_BITS)
+        
+    def scores(self, word):
+        """ Array of cond_prob(word, prev) for the candidates, in their order."""
+        
+        # the fallback depends on the word only: one probability for all candidates
+        scores = np.empty(len(self.candidates))
+        scores.fill(self.model.unigram_dist.prob(word))
+        j = self.model.vocab.get(word)
+        if j is not None and len(self.keys):
+            keys = self.prev_keys + self.keys.dtype.type(j)
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = self.keys[pos] == keys
+            scores[self.rows[found]] = self.bcounts[pos[found]] / self.ucounts[found]
+        return scores
+        
+    def top_k(self, word, k):
+        """ The k most probable candidates before `word`, as [(cond_prob, candidate)]."""
+        
+        scores = self.scores(word)
+        return [(float(scores[i]), self.candidates[i]) for i in _top_k(scores, k)]
+            
+def get_model(ufname="count_1w.txt", bfname="count_2w.txt", mfile=MODEL_FILE):
+    """ Return a count-based language model.
+        The compiled model file is used if it exists (memory-mapped, loads at once);
+        otherwise the model is built from the given corpus files.
+        Compile it with: python ngram_store.py compile
+    """
+    
+    if mfile and os.path.exists(mfile):
+        try:
+            return ngram_store.CompiledModel(mfile, handle_unk_long_words)
+        except ValueError: # compiled by an older version: recompile it
+            pass
     ufile = os.path.join(DATAFOLDER, ufname)
     bfile = os.path.join(DATAFOLDER, bfname)
     m_Model = SimpleModel(ufile, bfile)
     return m_Model
     
 ## DEMO APPLICATIONS
-def find_your_adjectives(noun, k=5):
-    """ Suggest the top k most probable adjective which might come right before the given noun."""
+def load_adjectives(fname=ADJECTIVE_FILE):
+    """ Load the list of all possible adjectives from file."""
     
-    # First, load the list of all possible adjective from file
     adj_list = []
-    with open(os.path.join(DATAFOLDER, "adjectives", "28k_adjectives.txt")) as adjs:
+    with open(fname) as adjs:
         for line in adjs:
             adj_list.append(line.strip().lower())
+    return adj_list
+    
+def find_your_adjectives(noun, k=5, m_Model=None, adj_list=None, adj_index=None, scorer=None):
+    """ Suggest the top k most probable adjective which might come right before the given noun.
+        The model and the adjective list are loaded unless given: pass them in
+        (and adj_index = ngram_store.candidate_positions(adj_list),
+        scorer = CandidateScorer(m_Model, adj_list)) to ask about many nouns, see batch_adjectives.
+    """
     
-    # Obtain our language model        
-    m_Model = get_model()
+    if adj_list is None:
+        adj_list = load_adjectives()
+    if m_Model is None:
+        m_Model = get_model()
+    if isinstance(m_Model, ngram_store.CompiledModel): # read the head of the noun's reverse index
+        return m_Model.top_previous(noun, k, adj_list, adj_index)
+    if scorer is None and np is not None:
+        scorer = CandidateScorer(m_Model, adj_list)
+    if scorer is not None:
+        return scorer.top_k(noun, k)
     
     score = map(lambda a: m_Model.cond_prob(noun, a), adj_list)
     score_2_adj = zip(score, adj_list)
-    return sorted(score_2_adj, reverse=True, key=lambda item: item[0])[:k]
+    return heapq.nlargest(k, score_2_adj, key=lambda item: item[0]) # = sorted(...)[:k], ties included
+    
+# model and adjectives of a batch, set before the worker processes fork so that they inherit them
+_batch = {}
+
+def _batch_query(noun):
+    return noun, find_your_adjectives(noun, _batch["k"], _batch["model"], _batch["adj_list"],
+                                      _batch["adj_index"], _batch["scorer"])
+
+def batch_adjectives(nouns, k=5, workers=1, m_Model=None, adj_list=None):
+    """ Top k adjectives for many nouns, with the model and adjectives loaded once.
+        Results are generated in the order of `nouns` as soon as they are ready,
+        so `nouns` can be a stream (e.g. lines of stdin) of any length. They are
+        those of find_your_adjectives, whatever the model and number of workers.
+    
+        Params:
+            nouns: iterable of nouns.
+            k: adjectives per noun.
+            workers: processes answering queries. A compiled model is memory-mapped,
+                     so its pages are shared by all of them.
+            m_Model, adj_list: as for find_your_adjectives; loaded if not given.
+            
+        Returns:
+            A generator of (noun, [(score, adjective)]).
+    """
     
+    if adj_list is None:
+        adj_list = load_adjectives()
+    if m_Model is None: # not `or`: a CompiledModel has a length
+        m_Model = get_model()
+    scorer = None
+    if np is not None and isinstance(m_Model, SimpleModel):
+        scorer = CandidateScorer(m_Model, adj_list)
+    _batch.update(k=k, model=m_Model, adj_list=adj_list, adj_index=ngram_store.candidate_positions(adj_list),
+                  scorer=scorer)
+    if workers <= 1:
+        for noun in nouns:
+            yield _batch_query(noun)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap(_batch_query, nouns, chunksize=16):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
 def main():
-    noun = "student"
-    top_probable_adjs = find_your_adjectives(noun, k=10)
-    for ans in top_probable_adjs: # print adj-noun and its score
-        print "%s: %f" %(ans[1] + " " + noun, ans[0])
+    parser = argparse.ArgumentParser(description="Suggest the adjectives most likely to come before nouns.")
+    parser.add_argument("nouns", nargs="*", help="nouns to ask about (default: student)")
+    parser.add_argument("-i", "--input", help="file with one noun per line, - for stdin; one output line per noun")
+    parser.add_argument("-k", type=int, default=10, help="adjectives per noun")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes")
+    args = parser.parse_args()
     
+    if args.input is None:
+        for noun, top_probable_adjs in batch_adjectives(args.nouns or ["student"], args.k, args.workers):
+            for ans in top_probable_adjs: # print adj-noun and its score
+                print "%s: %f" %(ans[1] + " " + noun, ans[0])
+        return
     
-if __name__ == "__main__":
-    main()
+    # batch mode: noun<TAB>adj:score adj:score ...
+    fin = sys.stdin if args.input == "-" else open(args.input)
+    nouns = (line.strip().lower() for line in fin if line.strip())
+    for noun, top_probable_adjs in batch_adjectives(nouns, args.k, args.workers):
+        sys.stdout.write("%s\t%s\n" %(noun, " ".join("%s:%g" %(adj, score) for score, adj in top_probable_adjs)))
+        sys.stdout.flush()
     
     
-    
\ No newline at end of file
+if __name__ == "__main__":
+    main()
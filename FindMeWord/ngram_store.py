@@ -0,0 +1,323 @@
+"""
+    Compiled n-gram counts for find_me_word.py.
+    The unigram and bigram counts of the corpus are compiled once into a
+    binary file:
+        - the vocabulary as a sorted string table (word id i = i-th smallest word),
+        - unigram counts as an integer array indexed by word id,
+        - bigrams as a sorted array of 64-bit keys (prev id << 32 | word id)
+          with a parallel array of counts,
+        - a reverse bigram index: for every word, the list of its previous
+          words with their bigram counts, most probable first, so that the
+          top k previous words of a word are the head of one list.
+    At load the file is memory-mapped, so a model is ready in milliseconds,
+    lookups are binary searches over the mapped pages and processes using
+    the same file share those pages.
+
+    Usage:
+        python ngram_store.py compile -u count_1w.txt -b count_2w.txt -o ngrams.bin
+        python ngram_store.py show student [prev]    (without prev: top previous words)
+"""
+
+import argparse
+import itertools
+import mmap
+import struct
+from collections import defaultdict
+
+MAGIC = "NGRM"
+VERSION = 2 # 2: reverse bigram index
+HEADER = struct.Struct("<4sIQQQQ") # magic, version, words, bigrams, tokens in the corpus, string bytes
+ID_BITS = 32 # a bigram key is (prev id << ID_BITS) | word id
+COUNT = struct.Struct("<Q")
+SPAN = struct.Struct("<II") # start and end of a word in the string table
+
+def _align(n):
+    """ Round n up to a multiple of 8, so that integer arrays stay aligned."""
+    return (n + 7) & ~7
+
+def _layout(nwords, nbigrams, strbytes):
+    """ Byte offsets of the sections of a model file:
+        word offsets, strings, unigram counts, bigram keys, bigram counts,
+        index offsets, index previous word ids, index counts, end of file.
+    """
+    at = [HEADER.size]
+    for size in (4 * (nwords + 1), strbytes, 8 * nwords, 8 * nbigrams, 8 * nbigrams,
+                 4 * (nwords + 1), 4 * nbigrams, 8 * nbigrams):
+        at.append(_align(at[-1] + size))
+    return at
+
+def compile_model(unigrams, bigrams, fname, n_tokens):
+    """ Write n-gram counts to a compiled model file.
+        Counts of repeated keys add up, as in find_me_word.WordDist.
+
+        Params:
+            unigrams: iterable of (word, count).
+            bigrams: iterable of ("prev word", count).
+            fname: output file.
+            n_tokens: total number of tokens in the corpus.
+
+        Returns:
+            (number of words, number of bigrams)
+    """
+    ucount = defaultdict(int)
+    for w, c in unigrams:
+        ucount[w] += int(c)
+    bcount = defaultdict(int)
+    for b, c in bigrams:
+        prev, word = b.split(" ", 1)
+        bcount[prev, word] += int(c)
+
+    # words seen only in bigrams get an id too, with unigram count 0
+    vocab = set(ucount)
+    for prev, word in bcount:
+        vocab.add(prev)
+        vocab.add(word)
+    words = sorted(vocab)
+    ids = dict((w, i) for i, w in enumerate(words))
+    keys = sorted(((ids[prev] << ID_BITS) | ids[word], c) for (prev, word), c in bcount.iteritems())
+    ucounts = [ucount.get(w, 0) for w in words]
+
+    # reverse index: postings grouped by word, in decreasing cond_prob(word, prev);
+    # previous words with no unigram count (no cond_prob from the bigram) go last
+    postings = [[] for _ in words]
+    for key, c in keys:
+        i, j = key >> ID_BITS, key & ((1 << ID_BITS) - 1)
+        postings[j].append((-c / float(ucounts[i]) if ucounts[i] else 0., i, c))
+    index = [0]
+    for plist in postings:
+        plist.sort()
+        index.append(index[-1] + len(plist))
+    postings = [p for plist in postings for p in plist]
+
+    strings = "".join(words)
+    offsets = [0]
+    for w in words:
+        offsets.append(offsets[-1] + len(w))
+    at = _layout(len(words), len(keys), len(strings))
+    buf = bytearray(at[-1])
+    HEADER.pack_into(buf, 0, MAGIC, VERSION, len(words), len(keys), n_tokens, len(strings))
+    struct.pack_into("<%dI" % len(offsets), buf, at[0], *offsets)
+    buf[at[1]:at[1] + len(strings)] = strings
+    struct.pack_into("<%dQ" % len(words), buf, at[2], *ucounts)
+    struct.pack_into("<%dQ" % len(keys), buf, at[3], *[k for k, _ in keys])
+    struct.pack_into("<%dQ" % len(keys), buf, at[4], *[c for _, c in keys])
+    struct.pack_into("<%dI" % len(index), buf, at[5], *index)
+    struct.pack_into("<%dI" % len(postings), buf, at[6], *[i for _, i, _ in postings])
+    struct.pack_into("<%dQ" % len(postings), buf, at[7], *[c for _, _, c in postings])
+    with open(fname, "wb") as fout:
+        fout.write(buf)
+    return len(words), len(keys)
+
+class CompiledModel(object):
+    """ Memory-mapped n-gram counts, answering prob/cond_prob like find_me_word.SimpleModel.
+        A word whose unigram count is 0 counts as unknown.
+
+        Params:
+            fname: file written by compile_model().
+            handle_missing: function (word, total) giving the probability of an
+                            unknown word. Default: 1/total, as in WordDist.
+    """
+
+    def __init__(self, fname, handle_missing=None):
+        self.fname = fname
+        with open(fname, "rb") as fin:
+            self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.nwords, self.nbigrams, self.n_tokens, strbytes = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %s n-gram model" % (fname, VERSION))
+        self.total = float(self.n_tokens)
+        (self.offsets_at, self.strings_at, self.ucounts_at, self.bkeys_at, self.bcounts_at,
+         self.index_at, self.prev_ids_at, self.prev_counts_at, _) = _layout(self.nwords, self.nbigrams, strbytes)
+        self.handle_missing = handle_missing or (lambda k, total: 1./total)
+
+    def __len__(self):
+        return self.nwords
+
+    def close(self):
+        self.data.close()
+
+    def word(self, i):
+        """ The word with id i."""
+        start, end = SPAN.unpack_from(self.data, self.offsets_at + 4 * i)
+        return self.data[self.strings_at + start:self.strings_at + end]
+
+    def word_id(self, w):
+        """ Id of word w, or None if it is not in the vocabulary."""
+        lo, hi = 0, self.nwords
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word(mid) < w:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.nwords and self.word(lo) == w:
+            return lo
+        return None
+
+    def _ucount(self, i):
+        """ Unigram count of word id i (None: 0)."""
+        if i is None:
+            return 0
+        return COUNT.unpack_from(self.data, self.ucounts_at + 8 * i)[0]
+
+    def _bcount(self, i, j):
+        """ Bigram count of word ids (i, j) (None: 0)."""
+        if i is None or j is None:
+            return 0
+        key = (i << ID_BITS) | j
+        lo, hi = 0, self.nbigrams
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if COUNT.unpack_from(self.data, self.bkeys_at + 8 * mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.nbigrams and COUNT.unpack_from(self.data, self.bkeys_at + 8 * lo)[0] == key:
+            return COUNT.unpack_from(self.data, self.bcounts_at + 8 * lo)[0]
+        return 0
+
+    def count(self, w):
+        """ Unigram count of word w (0 if unknown)."""
+        return self._ucount(self.word_id(w))
+
+    def bigram_count(self, prev, word):
+        """ Count of the bigram "prev word" (0 if unknown)."""
+        return self._bcount(self.word_id(prev), self.word_id(word))
+
+    def prob(self, w):
+        """ Estimate the probability of the given word w."""
+        c = self.count(w)
+        if c:
+            return c / self.total
+        return self.handle_missing(w, self.total)
+
+    def cond_prob(self, word, prev):
+        """ Estimate the conditional probability of a word, given previous word.
+            If not found bigram prev-word then falling back to unigram word.
+        """
+        i, j = self.word_id(prev), self.word_id(word)
+        b = self._bcount(i, j)
+        if b:
+            u = self._ucount(i)
+            if u:
+                return b / float(u)
+        c = self._ucount(j)
+        if c:
+            return c / self.total
+        return self.handle_missing(word, self.total)
+
+    def previous_words(self, word):
+        """ Generate the previous words of `word` from the reverse index, most
+            probable first: (prev, cond_prob(word, prev)) for every bigram "prev word"
+            whose prev has a unigram count. Only the pages of this list are read.
+        """
+        j = self.word_id(word)
+        if j is None:
+            return
+        start, end = SPAN.unpack_from(self.data, self.index_at + 4 * j)
+        for n in xrange(start, end):
+            i = struct.unpack_from("<I", self.data, self.prev_ids_at + 4 * n)[0]
+            u = self._ucount(i)
+            if not u: # the rest have no unigram count either
+                return
+            yield self.word(i), COUNT.unpack_from(self.data, self.prev_counts_at + 8 * n)[0] / float(u)
+
+    def top_previous(self, word, k, candidates=None, positions=None):
+        """ The k most probable previous words of `word`.
+            Same result as computing cond_prob(word, prev) for every candidate and
+            keeping the k best (ties in candidate order), but only the head of the
+            reverse index list of `word` is read in the usual case.
+
+            Params:
+                word: the word that follows.
+                k: number of previous words wanted.
+                candidates: list of allowed previous words. Default: the vocabulary.
+                positions: candidate_positions(candidates), when the caller already
+                           has it (batch queries).
+
+            Returns:
+                A list of (cond_prob, prev), best first.
+        """
+        if k <= 0:
+            return []
+        if positions is None and candidates is not None:
+            positions = candidate_positions(candidates)
+        if positions is None: # the vocabulary: candidate order is id order, i.e. word order
+            order = lambda item: (-item[0], item[1])
+        else:
+            order = lambda item: (-item[0], positions[item[1]])
+        fallback = self.prob(word) # the score of a candidate with no bigram
+        previous = ((score, prev) for prev, score in self.previous_words(word)
+                    if positions is None or prev in positions)
+
+        # the list is in id order within equal scores: read on while the k-th score
+        # repeats, then put the ties in candidate order
+        top = []
+        for score, prev in previous:
+            if score <= fallback or (len(top) >= k and score < top[-1][0]):
+                previous = itertools.chain([(score, prev)], previous)
+                break
+            top.append((score, prev))
+        top = sorted(top, key=order)[:k]
+        if len(top) == k:
+            return top
+
+        # then the candidates scoring exactly the fallback, in candidate order
+        taken = set(prev for _, prev in top)
+        if candidates is None:
+            candidates = (self.word(i) for i in xrange(self.nwords))
+        for prev in candidates:
+            if len(top) == k:
+                return top
+            if prev not in taken and self.cond_prob(word, prev) == fallback:
+                top.append((fallback, prev))
+                taken.add(prev)
+
+        # then those under the fallback, rarely needed
+        below = []
+        for score, prev in previous:
+            if score >= fallback: # the exact fallback scores are in already
+                continue
+            if len(below) >= k - len(top) and score < below[-1][0]:
+                break
+            below.append((score, prev))
+        return top + sorted(below, key=order)[:k - len(top)]
+
+def candidate_positions(candidates):
+    """ {candidate: index of its first occurrence} of a list of candidate words."""
+    positions = {}
+    for n, w in enumerate(candidates):
+        positions.setdefault(w, n)
+    return positions
+
+def main():
+    import find_me_word # not at the top: find_me_word imports this module
+
+    parser = argparse.ArgumentParser(description="Compile or query n-gram counts.")
+    parser.add_argument("command", choices=["compile", "show"])
+    parser.add_argument("words", nargs="*", help="show: word [prev]")
+    parser.add_argument("-u", "--unigrams", default=find_me_word.UNIGRAM_FILE, help="unigram counts (text)")
+    parser.add_argument("-b", "--bigrams", default=find_me_word.BIGRAM_FILE, help="bigram counts (text)")
+    parser.add_argument("-o", "--output", default=find_me_word.MODEL_FILE, help="compiled model file")
+    parser.add_argument("-n", "--tokens", type=int, default=find_me_word.N_TOKENS, help="tokens in the corpus")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        nwords, nbigrams = compile_model(find_me_word.gen_data(args.unigrams),
+                                         find_me_word.gen_data(args.bigrams), args.output, args.tokens)
+        print "Wrote %s words and %s bigrams to %s" %(nwords, nbigrams, args.output)
+    else:
+        model = CompiledModel(args.output, find_me_word.handle_unk_long_words)
+        word = args.words[0]
+        print "%s: count %s, prob %g" %(word, model.count(word), model.prob(word))
+        if len(args.words) > 1:
+            prev = args.words[1]
+            print "%s %s: count %s, cond_prob %g" %(prev, word, model.bigram_count(prev, word),
+                                                     model.cond_prob(word, prev))
+        else:
+            for score, prev in model.top_previous(word, 10):
+                print "  %s %s: %f" %(prev, word, score)
+        model.close()
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,48 @@
     
 """
 
+import argparse
+import hashlib
 import random
 import sys
 
+import bitboard
+import endgame
+import gamerecord
+import mcts
+import opening_book
+import patterns
+import search
+import transposition
+
 # CONSTANTS
 NROWS = 8
 NCOLS = 8
+SEARCH_TIME = 0.05 # seconds per move for the search strategy
+SEARCH_DEPTH = 8 # deepest iteration for the search strategy
+SEARCH_TABLE_MB = 16 # transposition table budget of the search strategy
+ENDGAME_EMPTIES = endgame.EMPTIES # the search strategy solves exactly from here on
+MCTS_PLAYOUTS = 500 # playouts per move for the MCTS strategy
+
+# RANDOM STREAMS
+# Every strategy takes an rng argument (anything with the random module's
+# interface; default: the global random module). Simulations give each game
+# its own stream from game_rng, so results do not depend on which process
+# plays the game or in which order.
+def game_rng(seed, *keys):
+    """ Independent random stream for one game, derived from a base seed and
+        keys such as the pairing and the game number. The same arguments give
+        the same stream in any process.
+    """
+    digest = hashlib.sha1(repr((seed,) + keys)).hexdigest()
+    return random.Random(int(digest[:16], 16))
 
 # BOARD-RELATED FUNCTIONS
+# The board is [xbits, obits, xcount, ocount]: a bitboard pair (see bitboard.py)
+# plus the disc counts, which make_move/unmake_move keep up to date.
+# BB_INDEX maps a player symbol to its bitboard slot; its count is at 2 + slot.
+BB_INDEX = {'X': 0, 'O': 1}
+
 #@profile
 def get_blank_board(nr=8, nc=8):
     """ Get a blank board of size nr x nc.
@@ -24,14 +58,11 @@ def get_blank_board(nr=8, nc=8):
             nc: number of columns. Default: 8
             
         Returns:
-            A new blank board: a list of nr row lists, each row list is a list of nc elements.
+            A new blank board: [xbits, obits, xcount, ocount].
     """
     assert nr % 2 == 0 and nc % 2 == 0, "The width and height of the board should be even!"
-    #bBoard = []
-	#for _ in xrange(nr):
-    #    bBoard.append([' '] * nc)
-    bBoard = [[' '] * nc for _ in xrange(nr)]   
-    return bBoard 
+    assert nr == bitboard.SIZE and nc == bitboard.SIZE, "Bitboards only support 8x8 boards!"
+    return [0, 0, 0, 0]
 
 #@profile
 def init_board(board):
@@ -43,17 +74,9 @@ def init_board(board):
         Returns:
             None
     """        
-    nr = NROWS
-    nc = NCOLS
-    assert nr % 2 == 0 and nc % 2 == 0, "The width and height of the board should be even!"
-    
-    for r in xrange(nr):
-        for c in xrange(nc):
-			board[r][c] = ' '
-	
-	
-    board[nr/2-1][nc/2-1] = board[nr/2][nc/2] = 'X'
-    board[nr/2][nc/2-1] = board[nr/2-1][nc/2] = 'O'
+    board[0] = bitboard.INIT_X
+    board[1] = bitboard.INIT_O
+    board[2] = board[3] = 2
 
 #@profile
 def get_board_copy(board):
@@ -65,15 +88,7 @@ def get_board_copy(board):
         Returns:
             copyBoard
     """
-    nr = NROWS
-    nc = NCOLS
-    copyBoard = get_blank_board(nr=nr, nc=nc)
-    
-    for r in xrange(nr):
-        for c in xrange(nc):
-            copyBoard[r][c] = board[r][c]
-    
-    return copyBoard
+    return board[:]
      
 def get_score_from_board(board):
     """ Get scores from current game board.
@@ -85,16 +100,7 @@ def get_score_from_board(board):
         Returns:
             A dictionary of score {'X': xscore, 'O': oscore} 
     """
-    xscore = oscore = 0
-    nr = NROWS
-    nc = NCOLS
-    for r in xrange(nr):
-        for c in xrange(nc):
-            if board[r][c] == 'X':
-                xscore += 1
-            if board[r][c] == 'O':
-                oscore += 1
-    return {'X': xscore, 'O': oscore}
+    return {'X': board[2], 'O': board[3]}
 
 # END BOARD-RELATED FUNCTIONS
 
@@ -152,45 +158,13 @@ def is_valid_move(board, symbol, r, c):
             A (non-empty) list of cells to flip if this move is valid.
             False if this move is invalid.
     """
-    if board[r][c] != ' ' or not is_on_board(board, r, c):
+    if not is_on_board(board, r, c):
         return False
-    
-    board[r][c] = symbol # temporarily set the symbol on the board
-    
-    if symbol == 'X':
-        opponent = 'O'
-    else:
-        opponent = 'X'
-    
-    cellsToFlip = [] # list of cells to flip after this move
-    for dr, dc in [[0,1],[0,-1],[1,1],[1,0],[1,-1],[-1,1],[-1,0],[-1,-1]]:
-        cur_r, cur_c = r, c
-        cur_r += dr
-        cur_c += dc
-        if is_on_board(board, cur_r, cur_c) and board[cur_r][cur_c] == opponent:
-            cur_r += dr
-            cur_c += dc
-            if not is_on_board(board, cur_r, cur_c):
-                continue
-            while board[cur_r][cur_c] == opponent:
-                cur_r += dr
-                cur_c += dc
-                if not is_on_board(board, cur_r, cur_c):
-                    break
-            if not is_on_board(board, cur_r, cur_c):
-                continue
-            if board[cur_r][cur_c] == symbol: # valid move
-                while True: # backtrack to get flip cells
-                    cur_r -= dr
-                    cur_c -= dc
-                    if cur_r == r and cur_c == c:
-                        break
-                    cellsToFlip.append([cur_r, cur_c])
-        
-    board[r][c] = ' ' # restore to empty cell
-    if not cellsToFlip: # no cell to flip, then invalid move
+    i = BB_INDEX[symbol]
+    flips = bitboard.get_flips(board[i], board[1-i], r*NCOLS + c)
+    if not flips: # no cell to flip, then invalid move
         return False
-    return cellsToFlip
+    return [bitboard.coords(sq) for sq in bitboard.iter_squares(flips)]
 
 #@profile   
 def get_valid_moves(board, symbol):
@@ -204,21 +178,16 @@ def get_valid_moves(board, symbol):
         Returns:
             A list of (r,c) coordinates for valid moves
     """
-    validMoves = []
-    nr = NROWS
-    nc = NCOLS
-    for r in xrange(nr):
-        for c in xrange(nc):
-            if is_valid_move(board, symbol, r, c) != False:
-                validMoves.append([r,c])
-    return validMoves
+    i = BB_INDEX[symbol]
+    moves = bitboard.get_moves(board[i], board[1-i])
+    return [[sq // NCOLS, sq % NCOLS] for sq in bitboard.iter_squares(moves)]
 
 # END MOVE-RELATED FUNCTIONS
 
 # USER INTERACTION FUNCTIONS
-def who_goes_first():
+def who_goes_first(rng=random):
     """ Decide who (user or computer) will play first."""
-    if random.randint(0,1) == 0:
+    if rng.randint(0,1) == 0:
         return 'computer'
     else:
         return 'player'
@@ -235,36 +204,75 @@ def make_move(board, symbol, r, c):
             r, c: coordinates of the move.
             
         Returns:
-            True if move successfully.
+            The undo record (mask of flipped discs, never 0) if move successfully.
             False if otherwise.
     """
     # First, check the validity of this move
-    cellsToFlip = is_valid_move(board, symbol, r, c)
-    if cellsToFlip == False:
+    i = BB_INDEX[symbol]
+    flips = bitboard.get_flips(board[i], board[1-i], r*NCOLS + c)
+    if not flips:
         return False
     
     # Update game board
-    board[r][c] = symbol
-    for fr, fc in cellsToFlip:
-        board[fr][fc] = symbol
-    return True
+    n = bitboard.popcount(flips)
+    board[i] |= flips | (1 << (r*NCOLS + c))
+    board[1-i] ^= flips
+    board[2+i] += n + 1
+    board[3-i] -= n
+    return flips
+
+def unmake_move(board, symbol, r, c, flips):
+    """ Take back a move made by make_move.
+        
+        Params:
+            board: current game board.
+            symbol: the player who made the move.
+            r, c: coordinates of the move.
+            flips: the undo record returned by make_move.
+            
+        Returns:
+            None
+    """
+    i = BB_INDEX[symbol]
+    n = bitboard.popcount(flips)
+    board[i] &= ~(flips | (1 << (r*NCOLS + c)))
+    board[1-i] |= flips
+    board[2+i] -= n + 1
+    board[3-i] += n
 
 # AI FUNCTIONS
-def get_random_move(board, symbol):
+# opening book consulted first by the strategies below (None: no book file)
+BOOK = opening_book.load_default()
+
+def get_book_move(board, symbol):
+    """ The opening book move for this position, or None if the book has no advice."""
+    if BOOK is None:
+        return None
+    i = BB_INDEX[symbol]
+    sq = BOOK.best_move(board[i], board[1-i])
+    if sq is None:
+        return None
+    return bitboard.coords(sq)
+
+def get_random_move(board, symbol, rng=random):
     """ Select random move from all valid moves."""
-    return random.choice(get_valid_moves(board, symbol))
+    return rng.choice(get_valid_moves(board, symbol))
 
-def get_basic_move(board, symbol):
+def get_basic_move(board, symbol, rng=random):
     """ Basic strategy: Select the best score move."""
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
     possibleMoves = get_valid_moves(board, symbol)
     #random.shuffle(possibleMoves)
         
     # try all possible moves, get the best move with highest score.
     bestScore = -1
+    count = 2 + BB_INDEX[symbol]
     for r, c in possibleMoves: 
-        cBoard = get_board_copy(board)
-        make_move(cBoard, symbol, r, c)
-        score = get_score_from_board(board)[symbol]
+        flips = make_move(board, symbol, r, c)
+        score = board[count]
+        unmake_move(board, symbol, r, c, flips)
         if score > bestScore: # update best score so far
             bestMove = [r, c]
             bestScore = score
@@ -272,10 +280,13 @@ def get_basic_move(board, symbol):
     return bestMove
 
 #@profile
-def get_side_best_move(board, symbol):
+def get_side_best_move(board, symbol, rng=random):
     """ Select a side move.
         Fall back to the best score move if no side move available. 
     """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
     possibleMoves = get_valid_moves(board, symbol)
     #random.shuffle(possibleMoves)
     
@@ -283,13 +294,16 @@ def get_side_best_move(board, symbol):
         if is_on_side(board, r, c):
             return [r,c]
     
-    return get_basic_move(board, symbol)
+    return get_basic_move(board, symbol, rng)
 
 #@profile
-def get_corner_best_move(board, symbol):
+def get_corner_best_move(board, symbol, rng=random):
     """ Select a corner move. 
         Fall back to the best score move if no corner move available.
     """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
     possibleMoves = get_valid_moves(board, symbol)
     #random.shuffle(possibleMoves)
     
@@ -297,13 +311,16 @@ def get_corner_best_move(board, symbol):
         if is_corner(board, r, c):
             return [r,c]
     
-    return get_basic_move(board, symbol)
+    return get_basic_move(board, symbol, rng)
 
-def get_corner_side_best_move(board, symbol):
+def get_corner_side_best_move(board, symbol, rng=random):
     """ Select a corner move.
         If no corner move available, select a side move.
         If no side move available, select the best score move.
     """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
     possibleMoves = get_valid_moves(board, symbol)
     #random.shuffle(possibleMoves)
     
@@ -315,13 +332,16 @@ def get_corner_side_best_move(board, symbol):
         if is_on_side(board, r, c):
             return [r,c]
         
-    return get_computer_move(board, symbol)
+    return get_basic_move(board, symbol, rng)
 
-def get_side_corner_best_move(board, symbol):
+def get_side_corner_best_move(board, symbol, rng=random):
     """ Select a side move.
         If no side move available, select a corner move.
         If no corner move available, select the best score move.
     """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
     possibleMoves = get_valid_moves(board, symbol)
     #random.shuffle(possibleMoves)
         
@@ -333,7 +353,68 @@ def get_side_corner_best_move(board, symbol):
         if is_corner(board, r, c):
             return [r,c]
         
-    return get_basic_move(board, symbol)
+    return get_basic_move(board, symbol, rng)
+
+# shared by every get_search_move call, so positions searched on earlier
+# moves are not expanded again
+SEARCH_TABLE = transposition.TranspositionTable(sizeMB=SEARCH_TABLE_MB)
+
+ENDGAME_SOLVER = endgame.EndgameSolver()
+
+def get_search_move(board, symbol, rng=random, timeLimit=SEARCH_TIME, maxDepth=SEARCH_DEPTH):
+    """ Search strategy: alpha-beta negamax with iterative deepening.
+        Searches as deep as the time budget allows, see search.py.
+        With ENDGAME_EMPTIES or fewer empty squares, plays perfectly (endgame.py).
+        Deterministic for a fixed depth; with a time budget the depth reached
+        depends on the machine.
+    """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
+    i = BB_INDEX[symbol]
+    if NROWS * NCOLS - board[2] - board[3] <= ENDGAME_EMPTIES:
+        sq, _ = ENDGAME_SOLVER.solve(board[i], board[1-i])
+        return bitboard.coords(sq)
+    searcher = search.Searcher(maxDepth=maxDepth, timeLimit=timeLimit,
+                               evaluate=patterns.evaluate, table=SEARCH_TABLE)
+    sq, _ = searcher.search(board[i], board[1-i])
+    return bitboard.coords(sq)
+
+def get_pattern_move(board, symbol, rng=random):
+    """ Pattern strategy: the move with the best pattern evaluation (patterns.py).
+        The pattern codes are updated incrementally for each candidate move.
+    """
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
+    i = BB_INDEX[symbol]
+    state = patterns.PatternState(board[0], board[1])
+    bestMove, bestScore = None, None
+    for r, c in get_valid_moves(board, symbol):
+        sq = r*NCOLS + c
+        flips = bitboard.get_flips(board[i], board[1-i], sq)
+        state.play(symbol, sq, flips)
+        score = state.evaluate(symbol)
+        state.undo(symbol, sq, flips)
+        if bestScore is None or score > bestScore:
+            bestMove, bestScore = [r, c], score
+    return bestMove
+
+# one MCTS player per symbol, so each keeps its own tree between moves
+MCTS_PLAYERS = {}
+
+def get_mcts_move(board, symbol, rng=random, playouts=MCTS_PLAYOUTS):
+    """ Monte Carlo Tree Search (UCT) strategy with heavy playouts, see mcts.py."""
+    bookMove = get_book_move(board, symbol)
+    if bookMove is not None:
+        return bookMove
+    if symbol not in MCTS_PLAYERS:
+        MCTS_PLAYERS[symbol] = mcts.MCTSPlayer(playouts=playouts, playout='heavy')
+    player = MCTS_PLAYERS[symbol]
+    player.playouts = playouts
+    player.rng = rng # playouts draw from the game's stream
+    i = BB_INDEX[symbol]
+    return bitboard.coords(player.get_move(board[i], board[1-i]))
 
 # HELPER FUNCTIONS
 def show_points(board, playerSymbol, computerSymbol):
@@ -346,58 +427,61 @@ def show_help():
     print 'This is Reversi game.\nCheck Wikipedia page for the detailed rule.'
 
 #@profile
-def main():
-    """ Main program for Othello game.
-        Text-based user interface. 
-        @todo: GUI version
+def main(numGames=10, recordFile=None, seed=None, xStrategy='corner', oStrategy='side'):
+    """ Simulate games between two registered strategies (see engine.py)
+        and print the win rates.
+        
+        Params:
+            numGames: number of games to simulate. Default: 10
+            recordFile: append every game to this game record file (see gamerecord.py).
+            seed: play game k with game_rng(seed, k). Default: the global random module.
+            xStrategy, oStrategy: strategy names for X and O.
     """
-    #print 'Welcome to Reversi World!'
+    import engine # engine imports this module for the rules
+    xMove, oMove = engine.get_strategy(xStrategy), engine.get_strategy(oStrategy)
     
     xwins = 0
     owins = 0
     ties = 0
-    #numGames = int(raw_input('Enter number of games to run: '))
-    numGames = 10
+    writer = None
+    if recordFile:
+        # every registered strategy, so that runs with any pairing can share the file
+        writer = gamerecord.GameWriter(recordFile, sorted(engine.STRATEGIES), append=True)
     for game in xrange(numGames):
-        #print 'Game #%s:' %(game),
-        mainBoard = get_blank_board(nr=NROWS, nc=NCOLS)
-        init_board(mainBoard)
-        if who_goes_first() == 'player':
+        rng = random if seed is None else game_rng(seed, game)
+        if who_goes_first(rng) == 'player':
             turn = 'X'
         else:
             turn = 'O'
-        
-        while True:
-            if turn == 'X':
-                opponent = 'O'
-                r, c = get_corner_best_move(mainBoard, 'X')
-                make_move(mainBoard, 'X', r, c) 
-            else:
-                opponent = 'X'
-                r, c = get_side_best_move(mainBoard, 'O')
-                make_move(mainBoard, 'O', r, c)
-            
-            if get_valid_moves(mainBoard, opponent) == []:
-                break
-            else:
-                turn = opponent
-            
-        scores = get_score_from_board(mainBoard)
-        #print 'X scored %s points. O scored %s points.' % (scores['X'], scores['O'])
-        if scores['X'] > scores['O']:
+        moves = []
+        diff = engine.play_game(xMove, oMove, turn, rng, moves)
+        if writer is not None:
+            writer.write(xStrategy, oStrategy, turn, diff, moves)
+        if diff > 0:
             xwins += 1
-        elif scores['O'] > scores['X']:
+        elif diff < 0:
             owins += 1
         else:
             ties += 1
+    if writer is not None:
+        writer.close()
         
     xpercent = round(xwins*100./numGames, 2)
     opercent = round(owins*100./numGames, 2)
     tiepercent = round(ties*100./numGames, 2)
-    '''
-    print 'X wins %s games (%s %%)\nO wins %s games (%s %%)\nTies for %s games (%s %%).' \
-            %(xwins, xpercent, owins, opercent, ties, tiepercent)
-    '''
+    print 'X (%s) wins %s games (%s %%)\nO (%s) wins %s games (%s %%)\nTies for %s games (%s %%).' \
+            %(xStrategy, xwins, xpercent, oStrategy, owins, opercent, ties, tiepercent)
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    import engine
+    parser = argparse.ArgumentParser(description='Simulate Reversi games between two strategies.')
+    parser.add_argument('-n', '--games', type=int, default=10, help='games to simulate')
+    parser.add_argument('-x', default='corner', choices=sorted(engine.STRATEGIES), help='strategy playing X')
+    parser.add_argument('-o', default='side', choices=sorted(engine.STRATEGIES), help='strategy playing O')
+    parser.add_argument('-r', '--record', default=None, help='append the games to this record file')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    try:
+        main(args.games, args.record, args.seed, args.x, args.o)
+    except gamerecord.StrategyMismatch as e:
+        parser.error(str(e))
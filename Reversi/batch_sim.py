@@ -0,0 +1,176 @@
+#!/usr/bin/python
+
+""" Batched Reversi (Othello) simulation with NumPy.
+    N games are held as arrays of bitboards and advanced together:
+    legal moves, move choice and flips are computed for all boards at once.
+    Author: Duong Nguyen
+
+    Usage: python batch_sim.py -n 100000 corner random
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import bitboard
+
+# CONSTANTS
+U64 = np.uint64
+ONE = U64(1)
+FULL = U64(bitboard.FULL)
+# (shift, mask) pairs as in bitboard.DIRECTIONS, split by shift direction
+LEFT = [(U64(d), U64(m)) for d, m in bitboard.DIRECTIONS if d > 0]
+RIGHT = [(U64(-d), U64(m)) for d, m in bitboard.DIRECTIONS if d < 0]
+SQUARES = np.arange(64, dtype=np.uint64)
+POPCOUNT8 = np.array([bin(i).count('1') for i in xrange(256)], dtype=np.int32)
+
+# Per-square bonus added to the flip count by the greedy policies.
+# 'corner'/'side' mimic get_corner_best_move/get_side_best_move of ai_sim2.
+_corner = np.array([(bitboard.CORNERS >> sq) & 1 for sq in xrange(64)], dtype=np.int32)
+_side = np.array([(bitboard.SIDES >> sq) & 1 for sq in xrange(64)], dtype=np.int32)
+POLICIES = {
+    'random': None,
+    'greedy': np.zeros(64, dtype=np.int32),
+    'corner': 100 * _corner,
+    'side': 100 * _side,
+    'corner_side': 200 * _corner + 100 * _side,
+}
+del _corner, _side
+
+def popcount(a):
+    """ Number of set bits of each element of a uint64 array."""
+    a = np.ascontiguousarray(a, dtype=np.uint64)
+    return POPCOUNT8[a.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def get_moves(own, opp):
+    """ Legal move masks for arrays of positions (see bitboard.get_moves)."""
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for d, mask in LEFT:
+        x = (own << d) & mask & opp
+        for _ in xrange(5):
+            x |= (x << d) & mask & opp
+        moves |= (x << d) & mask & empty
+    for d, mask in RIGHT:
+        x = (own >> d) & mask & opp
+        for _ in xrange(5):
+            x |= (x >> d) & mask & opp
+        moves |= (x >> d) & mask & empty
+    return moves
+
+def get_flips(own, opp, move):
+    """ Flip masks for arrays of positions and single-bit move masks.
+        Fill from the move through opponent discs; the fill is flipped
+        iff the next cell along the line is one's own disc.
+    """
+    flips = np.zeros_like(own)
+    for d, mask in LEFT:
+        x = (move << d) & mask & opp
+        for _ in xrange(5):
+            x |= (x << d) & mask & opp
+        flips |= np.where(((x << d) & mask & own) != 0, x, U64(0))
+    for d, mask in RIGHT:
+        x = (move >> d) & mask & opp
+        for _ in xrange(5):
+            x |= (x >> d) & mask & opp
+        flips |= np.where(((x >> d) & mask & own) != 0, x, U64(0))
+    return flips
+
+def choose_moves(policy, own, opp, moves, rng):
+    """ Pick one legal move per board.
+
+        Params:
+            policy: a key of POLICIES.
+            own, opp, moves: arrays of positions and their (non-empty) move masks.
+            rng: numpy RandomState.
+
+        Returns:
+            Array of single-bit move masks.
+    """
+    n = len(moves)
+    legal = ((moves[:, None] >> SQUARES) & ONE) != 0
+    if POLICIES[policy] is None:
+        score = rng.random_sample((n, 64))
+    else:
+        # flips gained on every square, plus the policy's square bonus
+        score = np.full((n, 64), -1, dtype=np.int32)
+        for sq in xrange(64):
+            col = legal[:, sq]
+            if not col.any():
+                continue
+            idx = np.nonzero(col)[0]
+            move = np.full(len(idx), ONE << U64(sq), dtype=np.uint64)
+            score[idx, sq] = popcount(get_flips(own[idx], opp[idx], move)) + POLICIES[policy][sq]
+    score[~legal] = -1
+    return ONE << score.argmax(axis=1).astype(np.uint64)
+
+def simulate(n, xPolicy='random', oPolicy='random', seed=0):
+    """ Play n games between two policies, all boards advanced in lockstep.
+        X moves first; a player without a legal move passes.
+
+        Returns:
+            Array of final disc differentials (xscore - oscore), one per game.
+    """
+    rng = np.random.RandomState(seed)
+    x = np.full(n, bitboard.INIT_X, dtype=np.uint64)
+    o = np.full(n, bitboard.INIT_O, dtype=np.uint64)
+    xTurn = np.ones(n, dtype=bool)
+    active = np.ones(n, dtype=bool)
+
+    while True:
+        idx = np.nonzero(active)[0]
+        if not len(idx):
+            break
+        turn = xTurn[idx]
+        own = np.where(turn, x[idx], o[idx])
+        opp = np.where(turn, o[idx], x[idx])
+        moves = get_moves(own, opp)
+        canMove = moves != 0
+
+        # games where neither side can move are over
+        over = ~canMove & (get_moves(opp, own) == 0)
+        active[idx[over]] = False
+
+        for policy, side in ((xPolicy, turn), (oPolicy, ~turn)):
+            sel = np.nonzero(canMove & side)[0]
+            if not len(sel):
+                continue
+            move = choose_moves(policy, own[sel], opp[sel], moves[sel], rng)
+            flips = get_flips(own[sel], opp[sel], move)
+            own[sel] |= flips | move
+            opp[sel] ^= flips
+
+        x[idx] = np.where(turn, own, opp)
+        o[idx] = np.where(turn, opp, own)
+        xTurn[idx] = ~turn # a pass also hands the turn over
+
+    return popcount(x) - popcount(o)
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched Reversi simulation with NumPy.')
+    parser.add_argument('xPolicy', choices=sorted(POLICIES))
+    parser.add_argument('oPolicy', choices=sorted(POLICIES))
+    parser.add_argument('-n', '--games', type=int, default=10000, help='number of games')
+    parser.add_argument('-b', '--batch', type=int, default=10000, help='boards simulated together')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    start = time.time()
+    diffs = []
+    for i, first in enumerate(xrange(0, args.games, args.batch)):
+        n = min(args.batch, args.games - first)
+        diffs.append(simulate(n, args.xPolicy, args.oPolicy, args.seed + i))
+    diffs = np.concatenate(diffs)
+    secs = time.time() - start
+
+    n = len(diffs)
+    xwins, owins = (diffs > 0).sum(), (diffs < 0).sum()
+    print 'X (%s) wins %s games (%.2f %%)\nO (%s) wins %s games (%.2f %%)\nTies for %s games (%.2f %%).' \
+            %(args.xPolicy, xwins, xwins*100./n, args.oPolicy, owins, owins*100./n,
+              n-xwins-owins, (n-xwins-owins)*100./n)
+    print 'Mean disc diff (X-O): %+.2f' % diffs.mean()
+    print '%s games in %.2f s (%.1f games/s)' %(n, secs, n / secs)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+
+""" Reproducible benchmarks for the Reversi engine hot paths.
+    Every board representation is measured on the same fixed corpus of
+    mid-game positions:
+        + microbenchmarks of is_valid_move, get_valid_moves, make_move,
+          get_board_copy and get_score_from_board
+        + perft move counts (depth 1..N) from the initial position
+        + full-game throughput with random play
+        + list-board move generation on larger N x N boards
+    Results are written as JSON so runs can be compared across representations.
+    Author: Duong Nguyen
+
+    Usage: python bench.py -d 6 --sizes 8 10 16 -o bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import bitboard
+import othello
+from perft import PERFT_COUNTS, REPRESENTATIONS, perft
+
+# CONSTANTS
+CORPUS_SEED = 20130524
+CORPUS_SIZE = 200
+CORPUS_PLIES = (20, 40) # corpus positions are taken after this many random plies
+BOARD_SIZES = [8, 10, 16] # N x N list boards for the board-size benchmark
+
+def make_corpus(n=CORPUS_SIZE, seed=CORPUS_SEED):
+    """ Fixed list of (xbits, obits, symbol to move) mid-game positions from random play."""
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < n:
+        x, o = bitboard.INIT_X, bitboard.INIT_O
+        symbol = 'X'
+        plies = rng.randint(*CORPUS_PLIES)
+        for _ in xrange(plies):
+            own, opp = (x, o) if symbol == 'X' else (o, x)
+            moves = bitboard.get_moves(own, opp)
+            if not moves:
+                break
+            sq = rng.choice(list(bitboard.iter_squares(moves)))
+            flips = bitboard.get_flips(own, opp, sq)
+            own, opp = own | flips | (1 << sq), opp ^ flips
+            x, o = (own, opp) if symbol == 'X' else (opp, own)
+            symbol = 'O' if symbol == 'X' else 'X'
+        else:
+            own, opp = (x, o) if symbol == 'X' else (o, x)
+            if bitboard.get_moves(own, opp):
+                corpus.append((x, o, symbol))
+    return corpus
+
+def timed(fn, minSecs):
+    """ Call fn() (one pass over the corpus) until minSecs have passed.
+
+        Returns:
+            (passes, seconds)
+    """
+    passes = 0
+    start = time.time()
+    while True:
+        fn()
+        passes += 1
+        secs = time.time() - start
+        if secs >= minSecs:
+            return passes, secs
+
+def bench_micro(module, boards, minSecs):
+    """ Per-call time of the board and move functions over the corpus.
+
+        Returns:
+            {function name: {'calls': .., 'secs': .., 'ns_per_call': ..}}
+    """
+    m = module
+    cells = [(b, s, r, c) for b, s in boards for r in xrange(8) for c in xrange(8)]
+    moves = [(b, s, r, c) for b, s in boards for r, c in m.get_valid_moves(b, s)]
+
+    def valid():
+        for b, s, r, c in cells:
+            m.is_valid_move(b, s, r, c)
+    def valid_moves():
+        for b, s in boards:
+            m.get_valid_moves(b, s)
+    def make():
+        for b, s, r, c in moves:
+            m.unmake_move(b, s, r, c, m.make_move(b, s, r, c))
+    def copy():
+        for b, s in boards:
+            m.get_board_copy(b)
+    def score():
+        for b, s in boards:
+            m.get_score_from_board(b)
+
+    results = {}
+    for name, fn, calls in (('is_valid_move', valid, len(cells)),
+                            ('get_valid_moves', valid_moves, len(boards)),
+                            ('make_move+unmake_move', make, len(moves)),
+                            ('get_board_copy', copy, len(boards)),
+                            ('get_score_from_board', score, len(boards))):
+        passes, secs = timed(fn, minSecs)
+        results[name] = {'calls': passes * calls, 'secs': round(secs, 4),
+                         'ns_per_call': round(secs * 1e9 / (passes * calls), 1)}
+    return results
+
+def bench_perft(module, toBoard, maxDepth):
+    """ Perft 1..maxDepth from the initial position, checked against PERFT_COUNTS."""
+    results = []
+    for depth in xrange(1, maxDepth + 1):
+        board = toBoard(bitboard.INIT_X, bitboard.INIT_O)
+        start = time.time()
+        nodes = perft(module, board, 'X', depth)
+        secs = time.time() - start
+        results.append({'depth': depth, 'nodes': nodes, 'secs': round(secs, 4),
+                        'nodes_per_sec': round(nodes / secs) if secs else None,
+                        'correct': depth >= len(PERFT_COUNTS) or nodes == PERFT_COUNTS[depth]})
+    return results
+
+def bench_games(module, toBoard, nGames, seed=CORPUS_SEED):
+    """ Full random games per second (move generation + make_move to the end)."""
+    m = module
+    rng = random.Random(seed)
+    start = time.time()
+    for _ in xrange(nGames):
+        board = toBoard(bitboard.INIT_X, bitboard.INIT_O)
+        symbol, passed = 'X', False
+        while True:
+            moves = m.get_valid_moves(board, symbol)
+            if moves:
+                r, c = rng.choice(moves)
+                m.make_move(board, symbol, r, c)
+                passed = False
+            elif passed:
+                break
+            else:
+                passed = True
+            symbol = 'O' if symbol == 'X' else 'X'
+    secs = time.time() - start
+    return {'games': nGames, 'secs': round(secs, 4), 'games_per_sec': round(nGames / secs, 1)}
+
+def make_size_corpus(n, size, seed=CORPUS_SEED):
+    """ n positions (board, symbol to move) on an n x n list board, taken after
+        a random number of random plies (between a third and two thirds of the squares).
+    """
+    rng = random.Random(seed + size)
+    corpus = []
+    while len(corpus) < n:
+        board = othello.get_blank_board(nr=size, nc=size)
+        othello.init_board(board)
+        symbol = 'X'
+        for _ in xrange(rng.randint(size * size // 3, 2 * size * size // 3)):
+            moves = othello.get_valid_moves(board, symbol)
+            if not moves:
+                break
+            r, c = rng.choice(moves)
+            othello.make_move(board, symbol, r, c)
+            symbol = 'O' if symbol == 'X' else 'X'
+        else:
+            if othello.get_valid_moves(board, symbol):
+                corpus.append((board, symbol))
+    return corpus
+
+def bench_sizes(sizes, minSecs, nPositions=20):
+    """ get_valid_moves of the list engine on N x N boards.
+        Time per empty square shows the cost per ray step, not per bounds check.
+        
+        Returns:
+            {size: {'positions': .., 'ns_per_call': .., 'ns_per_empty': ..}}
+    """
+    results = {}
+    for size in sizes:
+        boards = make_size_corpus(nPositions, size)
+        empties = sum(row.count(' ') for b, _ in boards for row in b)
+        def valid_moves():
+            for b, s in boards:
+                othello.get_valid_moves(b, s)
+        passes, secs = timed(valid_moves, minSecs)
+        results[str(size)] = {'positions': len(boards),
+                              'ns_per_call': round(secs * 1e9 / (passes * len(boards)), 1),
+                              'ns_per_empty': round(secs * 1e9 / (passes * empties), 1)}
+    return results
+
+def run(names, perftDepth, nGames, minSecs, sizes=BOARD_SIZES):
+    """ Run every benchmark for the named representations. Returns the JSON-ready report."""
+    corpus = make_corpus()
+    report = {'python': sys.version.split()[0],
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'corpus': {'seed': CORPUS_SEED, 'positions': len(corpus)},
+              'results': {}}
+    for name in names:
+        module, toBoard = REPRESENTATIONS[name]
+        boards = [(toBoard(x, o), s) for x, o, s in corpus]
+        report['results'][name] = {
+            'micro': bench_micro(module, boards, minSecs),
+            'perft': bench_perft(module, toBoard, perftDepth),
+            'games': bench_games(module, toBoard, nGames),
+        }
+    if sizes:
+        report['sizes'] = bench_sizes(sizes, minSecs)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Reversi engine hot paths.')
+    parser.add_argument('-r', '--repr', nargs='+', default=sorted(REPRESENTATIONS),
+                        choices=sorted(REPRESENTATIONS), help='board representations to measure')
+    parser.add_argument('-d', '--perft-depth', type=int, default=6, help='deepest perft (up to 8 is quick for bitboards)')
+    parser.add_argument('-g', '--games', type=int, default=50, help='random games for the throughput benchmark')
+    parser.add_argument('-t', '--min-time', type=float, default=0.5, help='seconds per microbenchmark')
+    parser.add_argument('--sizes', type=int, nargs='*', default=BOARD_SIZES,
+                        help='N x N list boards for the board-size benchmark (none to skip)')
+    parser.add_argument('-o', '--output', default=None, help='JSON output file (default: stdout)')
+    args = parser.parse_args()
+
+    report = run(args.repr, args.perft_depth, args.games, args.min_time, args.sizes)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fout:
+            fout.write(text + '\n')
+    else:
+        print text
+
+    for name, res in sorted(report['results'].items()): # short summary on stderr
+        sys.stderr.write('%s: %s\n' %(name, ', '.join('%s %s ns' %(k, v['ns_per_call'])
+                                                      for k, v in sorted(res['micro'].items()))))
+        sys.stderr.write('%s: perft %s, %s games/s\n' %(name,
+                         ' '.join('%d:%d%s' %(p['depth'], p['nodes'], '' if p['correct'] else '!')
+                                  for p in res['perft']), res['games']['games_per_sec']))
+    for size, res in sorted(report.get('sizes', {}).items(), key=lambda kv: int(kv[0])):
+        sys.stderr.write('lists %sx%s: get_valid_moves %s ns (%s ns per empty square)\n'
+                         %(size, size, res['ns_per_call'], res['ns_per_empty']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+
+""" Bitboard primitives for the 8x8 Reversi (Othello) board.
+    A position is kept as two 64-bit integers, one per player.
+    Bit number r*8 + c is set iff cell (r,c) holds a disc of that player.
+    Author: Duong Nguyen
+"""
+
+# CONSTANTS
+SIZE = 8
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_COL0 = 0xFEFEFEFEFEFEFEFE # every cell except column 0
+NOT_COL7 = 0x7F7F7F7F7F7F7F7F # every cell except column 7
+
+# initial position (same as init_board): X on (3,3),(4,4); O on (3,4),(4,3)
+INIT_X = (1 << 27) | (1 << 36)
+INIT_O = (1 << 28) | (1 << 35)
+
+# (shift, mask) pairs: positive shift moves towards higher bit numbers.
+# The mask removes discs that wrapped around the left/right board edge.
+DIRECTIONS = ((1, NOT_COL0), (-1, NOT_COL7),
+              (8, FULL), (-8, FULL),
+              (9, NOT_COL0), (7, NOT_COL7),
+              (-7, NOT_COL0), (-9, NOT_COL7))
+
+CORNERS = (1 << 0) | (1 << 7) | (1 << 56) | (1 << 63)
+SIDES = 0xFF818181818181FF
+
+
+def square(r, c):
+    """ Bit index of cell (r,c)."""
+    return r * SIZE + c
+
+def coords(sq):
+    """ Cell [r,c] of bit index sq."""
+    return [sq // SIZE, sq % SIZE]
+
+def popcount(b):
+    """ Number of set bits (discs) in b."""
+    return bin(b).count('1')
+
+def iter_squares(b):
+    """ Generate the bit indices set in b, lowest first."""
+    while b:
+        low = b & -b
+        yield low.bit_length() - 1
+        b ^= low
+
+def get_moves(own, opp):
+    """ Bitmask of all legal moves for the player owning `own`.
+
+        Params:
+            own: discs of the player to move.
+            opp: discs of the opponent.
+
+        Returns:
+            An integer whose set bits are the legal move squares.
+    """
+    empty = ~(own | opp) & FULL
+    moves = 0
+    for d, mask in DIRECTIONS:
+        if d > 0:
+            x = (own << d) & mask & opp
+            x |= (x << d) & mask & opp
+            x |= (x << d) & mask & opp
+            x |= (x << d) & mask & opp
+            x |= (x << d) & mask & opp
+            x |= (x << d) & mask & opp
+            moves |= (x << d) & mask & empty
+        else:
+            d = -d
+            x = (own >> d) & mask & opp
+            x |= (x >> d) & mask & opp
+            x |= (x >> d) & mask & opp
+            x |= (x >> d) & mask & opp
+            x |= (x >> d) & mask & opp
+            x |= (x >> d) & mask & opp
+            moves |= (x >> d) & mask & empty
+    return moves
+
+def get_flips(own, opp, sq):
+    """ Bitmask of the opponent discs flipped by playing at sq.
+
+        Params:
+            own: discs of the player to move.
+            opp: discs of the opponent.
+            sq: bit index of the move.
+
+        Returns:
+            The flip mask. 0 if the move is illegal (or sq is occupied).
+    """
+    move = 1 << sq
+    if (own | opp) & move:
+        return 0
+    flips = 0
+    for d, mask in DIRECTIONS:
+        f = 0
+        if d > 0:
+            x = (move << d) & mask
+            while x & opp:
+                f |= x
+                x = (x << d) & mask
+        else:
+            d = -d
+            x = (move >> d) & mask
+            while x & opp:
+                f |= x
+                x = (x >> d) & mask
+        if x & own:
+            flips |= f
+    return flips
+
+def from_rows(board):
+    """ Convert a list-of-lists board (' ', 'X', 'O') to (xbits, obits)."""
+    xbits = obits = 0
+    for r in xrange(SIZE):
+        row = board[r]
+        for c in xrange(SIZE):
+            if row[c] == 'X':
+                xbits |= 1 << (r * SIZE + c)
+            elif row[c] == 'O':
+                obits |= 1 << (r * SIZE + c)
+    return xbits, obits
+
+def to_rows(xbits, obits):
+    """ Convert (xbits, obits) to a list-of-lists board (' ', 'X', 'O')."""
+    board = [[' '] * SIZE for _ in xrange(SIZE)]
+    for sq in iter_squares(xbits):
+        board[sq // SIZE][sq % SIZE] = 'X'
+    for sq in iter_squares(obits):
+        board[sq // SIZE][sq % SIZE] = 'O'
+    return board
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+""" Thinking-time management for a computer player.
+    A GameClock holds a per-game budget and/or a per-move cap. Before each
+    move it sets a deadline: the time left on the game clock shared out over
+    the moves the player still has to make, capped by the per-move limit,
+    minus a small overhead kept back for move generation and I/O.
+    Every move is logged (move, source, nodes, depth, time used, budget) so
+    latency percentiles can be reported.
+    Author: Duong Nguyen
+"""
+
+import time
+
+# CONSTANTS
+MOVE_OVERHEAD = 0.005 # seconds kept back per move, outside the search
+MIN_MOVE_TIME = 0.005 # never plan less than this for a move
+
+class GameClock(object):
+    """ Time budget of one player for one game.
+
+        Params:
+            gameTime: seconds for the whole game, None for no game clock.
+            moveTime: seconds allowed per move, None for no cap.
+    """
+
+    def __init__(self, gameTime=None, moveTime=None):
+        self.gameTime = gameTime
+        self.remaining = gameTime
+        self.moveTime = moveTime
+        self.started = None
+        self.deadline = None
+        self.budget = None
+        self.log = []
+
+    def allocate(self, empties):
+        """ Seconds to plan for a move with `empties` empty squares on the board,
+            or None if there is no limit at all.
+        """
+        limit = self.moveTime
+        if self.remaining is not None:
+            movesLeft = max(1, (empties + 1) // 2) # the two players alternate
+            share = self.remaining / movesLeft
+            limit = share if limit is None else min(limit, share)
+        if limit is None:
+            return None
+        return max(MIN_MOVE_TIME, limit - MOVE_OVERHEAD)
+
+    def start(self, empties):
+        """ Start thinking about a move; sets `budget` and `deadline`."""
+        self.started = time.time()
+        self.budget = self.allocate(empties)
+        self.deadline = None if self.budget is None else self.started + self.budget
+
+    def time_left(self):
+        """ Seconds to the deadline of the current move (never negative), None if unlimited."""
+        if self.deadline is None:
+            return None
+        return max(0., self.deadline - time.time())
+
+    def stop(self, move, source, nodes=0, depth=0):
+        """ End the current move: charge its time to the game clock and log it.
+
+            Params:
+                move: the move played.
+                source: what chose it ('book', 'endgame', 'search', 'heuristic').
+                nodes, depth: size of the search behind it.
+
+            Returns:
+                The log entry: {'move', 'source', 'nodes', 'depth', 'secs', 'budget'}.
+        """
+        secs = time.time() - self.started
+        if self.remaining is not None:
+            self.remaining = max(0., self.remaining - secs)
+        entry = {'move': move, 'source': source, 'nodes': nodes, 'depth': depth,
+                 'secs': secs, 'budget': self.budget}
+        self.log.append(entry)
+        self.started = self.deadline = None
+        return entry
+
+    def percentile(self, q):
+        """ q-th percentile (0..100) of the time used per move so far."""
+        secs = sorted(entry['secs'] for entry in self.log)
+        if not secs:
+            return 0.
+        return secs[min(len(secs) - 1, int(round(q / 100. * (len(secs) - 1))))]
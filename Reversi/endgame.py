@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+""" Exact endgame solver for Reversi (Othello) on bitboards.
+    Perfect play to the end of the game: either the exact final disc
+    difference or only win/loss/draw (a null window, much faster).
+    Author: Duong Nguyen
+
+    Usage: python endgame.py -e 12 -n 5
+"""
+
+import argparse
+import random
+import time
+
+import bitboard
+from search import CHECK_EVERY, SearchTimeout
+
+# CONSTANTS
+EMPTIES = 10 # default threshold: solve exactly from this many empty squares on
+FASTEST_FIRST_EMPTIES = 7 # below this, ordering by parity alone is cheaper
+INF = 1 << 30
+# the four 4x4 quadrants; an odd number of empties in a quadrant means
+# the player who moves there can usually also get the last move there
+QUADRANTS = (0x000000000F0F0F0F, 0x00000000F0F0F0F0,
+             0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+
+class EndgameSolver(object):
+    """ Alpha-beta solver searching every line to the end of the game.
+
+        Params:
+            wld: only find out win/loss/draw instead of the exact disc difference.
+
+        After solve(), `nodes` and `secs` hold the size and duration of the search.
+    """
+
+    def __init__(self, wld=False):
+        self.wld = wld
+        self.nodes = 0
+        self.secs = 0.
+        self.deadline = None
+
+    def solve(self, own, opp, timeLimit=None):
+        """ Perfect-play result of a position for the player owning `own`.
+
+            Params:
+                timeLimit: seconds allowed, None for no limit. The solver raises
+                           search.SearchTimeout when they run out.
+
+            Returns:
+                (square, score): the best move (None if the player must pass) and
+                the final disc difference under perfect play. In wld mode the
+                score is only reliable in its sign: >0 win, <0 loss, 0 draw.
+        """
+        self.nodes = 0
+        start = time.time()
+        self.deadline = None if timeLimit is None else start + timeLimit
+        try:
+            return self._solve_root(own, opp)
+        finally:
+            self.secs = time.time() - start
+
+    def _solve_root(self, own, opp):
+        """ solve() without the bookkeeping."""
+        if self.wld:
+            alpha, beta = -1, 1
+        else:
+            alpha, beta = -INF, INF
+
+        empties = bitboard.popcount(~(own | opp) & bitboard.FULL)
+        moves = bitboard.get_moves(own, opp)
+        if not moves:
+            best, score = None, -self._solve(opp, own, empties, -beta, -alpha, True)
+        else:
+            best, score = None, -INF
+            for sq in self._order(own, opp, moves, empties):
+                flips = bitboard.get_flips(own, opp, sq)
+                v = -self._solve(opp ^ flips, own | flips | (1 << sq), empties - 1, -beta, -alpha, False)
+                if v > score:
+                    best, score = sq, v
+                    if v > alpha:
+                        alpha = v
+                        if alpha >= beta:
+                            break
+        return best, score
+
+    def _order(self, own, opp, moves, empties):
+        """ Moves in odd-parity quadrants first; with enough empties left,
+            fewest opponent replies first (fastest-first).
+        """
+        empty = ~(own | opp) & bitboard.FULL
+        popcount = bitboard.popcount
+        odd = even = 0
+        for q in QUADRANTS:
+            if popcount(empty & q) & 1:
+                odd |= moves & q
+            else:
+                even |= moves & q
+        if empties < FASTEST_FIRST_EMPTIES:
+            return list(bitboard.iter_squares(odd)) + list(bitboard.iter_squares(even))
+
+        get_flips, get_moves = bitboard.get_flips, bitboard.get_moves
+        keyed = []
+        for part, parity in ((odd, 0), (even, 1)):
+            for sq in bitboard.iter_squares(part):
+                flips = get_flips(own, opp, sq)
+                replies = popcount(get_moves(opp ^ flips, own | flips | (1 << sq)))
+                keyed.append((parity, replies, sq))
+        keyed.sort()
+        return [sq for _, _, sq in keyed]
+
+    def _solve(self, own, opp, empties, alpha, beta, passed):
+        """ Negamax alpha-beta value with `empties` empty squares left;
+            `passed` says the opponent just passed.
+        """
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+        popcount = bitboard.popcount
+        if empties == 1: # last square: play it out directly
+            sq = (~(own | opp) & bitboard.FULL).bit_length() - 1
+            flips = bitboard.get_flips(own, opp, sq)
+            if flips:
+                return popcount(own) - popcount(opp) + 2 * popcount(flips) + 1
+            flips = bitboard.get_flips(opp, own, sq)
+            if flips:
+                return popcount(own) - popcount(opp) - 2 * popcount(flips) - 1
+            return popcount(own) - popcount(opp)
+
+        moves = bitboard.get_moves(own, opp)
+        if not moves:
+            if passed: # neither player can move
+                return popcount(own) - popcount(opp)
+            return -self._solve(opp, own, empties, -beta, -alpha, True)
+
+        get_flips = bitboard.get_flips
+        if not moves & (moves - 1): # a single move: no ordering needed
+            flips = get_flips(own, opp, moves.bit_length() - 1)
+            return -self._solve(opp ^ flips, own | flips | moves, empties - 1, -beta, -alpha, False)
+
+        best = -INF
+        for sq in self._order(own, opp, moves, empties):
+            flips = get_flips(own, opp, sq)
+            v = -self._solve(opp ^ flips, own | flips | (1 << sq), empties - 1, -beta, -alpha, False)
+            if v > best:
+                best = v
+                if v > alpha:
+                    alpha = v
+                    if alpha >= beta:
+                        break
+        return best
+
+def random_position(empties, rng):
+    """ A position with `empties` empty squares reached by random play,
+        from the point of view of the player to move (who has a move).
+    """
+    while True:
+        own, opp = bitboard.INIT_X, bitboard.INIT_O
+        while bitboard.popcount(~(own | opp) & bitboard.FULL) > empties:
+            moves = bitboard.get_moves(own, opp)
+            if not moves:
+                if not bitboard.get_moves(opp, own):
+                    break
+                own, opp = opp, own
+                continue
+            sq = rng.choice(list(bitboard.iter_squares(moves)))
+            flips = bitboard.get_flips(own, opp, sq)
+            own, opp = opp ^ flips, own | flips | (1 << sq)
+        if bitboard.popcount(~(own | opp) & bitboard.FULL) == empties and bitboard.get_moves(own, opp):
+            return own, opp
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve random Reversi endgames and report speed.')
+    parser.add_argument('-e', '--empties', type=int, default=EMPTIES, help='empty squares left')
+    parser.add_argument('-n', '--positions', type=int, default=5, help='positions to solve')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--wld', action='store_true', help='win/loss/draw only')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    solver = EndgameSolver(wld=args.wld)
+    totalNodes = totalSecs = 0
+    for _ in xrange(args.positions):
+        own, opp = random_position(args.empties, rng)
+        sq, score = solver.solve(own, opp)
+        totalNodes += solver.nodes
+        totalSecs += solver.secs
+        print 'move %s score %+d: %s nodes in %.3f s' %(bitboard.coords(sq), score, solver.nodes, solver.secs)
+    print 'Total %s nodes in %.2f s (%.0f nodes/s)' %(totalNodes, totalSecs, totalNodes / max(totalSecs, 1e-9))
+
+if __name__ == '__main__':
+    main()
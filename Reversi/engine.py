@@ -0,0 +1,182 @@
+#!/usr/bin/python
+
+""" Simulation engine: strategy registry and match API.
+    The rules come from ai_sim2 (bitboards). A strategy is a move function
+    move(board, symbol, rng) -> [r, c], registered under a name; matches are
+    played by name so they can be spread over a process pool.
+    Every game has its own random stream (ai_sim2.game_rng) derived from the
+    base seed, the pairing and the game number, so results are identical for
+    any pool size and chunk size.
+    Author: Duong Nguyen
+
+    Usage:
+        import engine
+        stats = engine.play_match('corner', 'side', 1000, workers=4)
+        print stats['wins'], stats['losses'], stats['ties'], stats['meanDiff']
+"""
+
+import multiprocessing
+import random
+import time
+
+import ai_sim2 as sim
+
+# CONSTANTS
+CHUNK_SIZE = 100 # games per task sent to a worker
+
+# strategy name -> move function(board, symbol, rng)
+STRATEGIES = {}
+
+def register_strategy(name, move=None):
+    """ Register a move function under `name`. Also usable as a decorator:
+
+            @engine.register_strategy('greedy')
+            def get_greedy_move(board, symbol, rng):
+                ...
+
+        Strategies must be registered at import time (or before play_match
+        starts its pool) so that worker processes know them too.
+    """
+    if move is None:
+        return lambda fn: register_strategy(name, fn)
+    STRATEGIES[name] = move
+    return move
+
+def get_strategy(name):
+    """ The move function registered under `name`."""
+    try:
+        return STRATEGIES[name]
+    except KeyError:
+        raise ValueError('Unknown strategy %r, choose from %s' % (name, sorted(STRATEGIES)))
+
+for _name, _move in (('random', sim.get_random_move),
+                     ('basic', sim.get_basic_move),
+                     ('side', sim.get_side_best_move),
+                     ('corner', sim.get_corner_best_move),
+                     ('corner_side', sim.get_corner_side_best_move),
+                     ('side_corner', sim.get_side_corner_best_move),
+                     ('search', sim.get_search_move),
+                     ('pattern', sim.get_pattern_move),
+                     ('mcts', sim.get_mcts_move)):
+    register_strategy(_name, _move)
+
+def play_game(xMove, oMove, turn='X', rng=random, moves=None):
+    """ Play one game between two move functions.
+        A player without a valid move passes; the game ends when neither can move.
+
+        Params:
+            xMove, oMove: move functions for X and O.
+            turn: the symbol who moves first.
+            rng: random stream passed to the move functions. Default: the random module.
+            moves: if given, a list the played squares (r*8 + c) are appended to.
+
+        Returns:
+            xscore - oscore at the end of the game.
+    """
+    board = sim.get_blank_board(nr=sim.NROWS, nc=sim.NCOLS)
+    sim.init_board(board)
+    moveFor = {'X': xMove, 'O': oMove}
+    passed = False
+    while True:
+        opponent = 'O' if turn == 'X' else 'X'
+        if sim.get_valid_moves(board, turn):
+            r, c = moveFor[turn](board, turn, rng)
+            sim.make_move(board, turn, r, c)
+            if moves is not None:
+                moves.append(r*sim.NCOLS + c)
+            passed = False
+        elif passed: # neither player can move
+            break
+        else:
+            passed = True
+        turn = opponent
+    scores = sim.get_score_from_board(board)
+    return scores['X'] - scores['O']
+
+def play_chunk(task):
+    """ Worker: play one chunk of games between strategies a and b.
+        a plays X in even games and O in odd games; X always moves first.
+
+        Params:
+            task: (nameA, nameB, first game number, nGames, base seed)
+
+        Returns:
+            (nameA, nameB, list of disc differentials from a's point of view)
+    """
+    nameA, nameB, start, nGames, seed = task
+    a, b = get_strategy(nameA), get_strategy(nameB)
+    diffs = []
+    for game in xrange(start, start + nGames):
+        rng = sim.game_rng(seed, nameA, nameB, game)
+        if game % 2 == 0:
+            diffs.append(play_game(a, b, rng=rng))
+        else:
+            diffs.append(-play_game(b, a, rng=rng))
+    return nameA, nameB, diffs
+
+def make_tasks(pairs, nGames, seed=0, chunkSize=CHUNK_SIZE):
+    """ Split nGames per (nameA, nameB) pairing into (nameA, nameB, start, n, seed) tasks."""
+    tasks = []
+    for nameA, nameB in pairs:
+        for start in xrange(0, nGames, chunkSize):
+            n = min(chunkSize, nGames - start)
+            tasks.append((nameA, nameB, start, n, seed))
+    return tasks
+
+def match_stats(nameA, nameB, diffs, secs=0.):
+    """ Summary of a match from nameA's point of view."""
+    n = len(diffs)
+    return {'strategies': (nameA, nameB),
+            'games': n,
+            'wins': sum(1 for d in diffs if d > 0),
+            'losses': sum(1 for d in diffs if d < 0),
+            'ties': sum(1 for d in diffs if d == 0),
+            'meanDiff': sum(diffs) * 1. / n if n else 0.,
+            'diffs': diffs,
+            'secs': secs}
+
+def play_matches(pairs, nGames, workers=1, seed=0, chunkSize=CHUNK_SIZE):
+    """ Play nGames for every (nameA, nameB) pairing, sharing one process pool.
+
+        Params:
+            pairs: list of (nameA, nameB) strategy names.
+            nGames: number of games per pairing.
+            workers: size of the process pool. None: number of CPUs.
+                     1 plays everything in this process.
+            seed: base seed; game k of a pairing plays with game_rng(seed, nameA, nameB, k).
+            chunkSize: games per task.
+
+        Returns:
+            {(nameA, nameB): match_stats(...)}; 'secs' is the wall time of the
+            whole run.
+    """
+    for nameA, nameB in pairs:
+        get_strategy(nameA), get_strategy(nameB)
+    tasks = make_tasks(pairs, nGames, seed, chunkSize)
+
+    start = time.time()
+    if workers == 1:
+        results = map(play_chunk, tasks)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(play_chunk, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    secs = time.time() - start
+
+    # merge the chunk results, tasks come back in order
+    diffsFor = dict((pair, []) for pair in pairs)
+    for nameA, nameB, diffs in results:
+        diffsFor[(nameA, nameB)].extend(diffs)
+    return dict((pair, match_stats(pair[0], pair[1], diffs, secs)) for pair, diffs in diffsFor.items())
+
+def play_match(strategyA, strategyB, nGames, workers=1, seed=0, chunkSize=CHUNK_SIZE):
+    """ Play nGames between two registered strategies, alternating colours.
+
+        Returns:
+            {'strategies', 'games', 'wins', 'losses', 'ties', 'meanDiff', 'diffs', 'secs'}
+            counted from strategyA's point of view.
+    """
+    return play_matches([(strategyA, strategyB)], nGames, workers, seed, chunkSize)[(strategyA, strategyB)]
@@ -0,0 +1,241 @@
+#!/usr/bin/python
+
+""" Compact binary game records for simulation output.
+    File layout:
+        file header: MAGIC, VERSION, length of the strategy list, then the
+                     strategy names (comma separated)
+        games, back to back: GAME header (X strategy, O strategy, first
+                     mover, final X - O disc difference, number of moves),
+                     then one byte per move: the square r*8 + c.
+    Passes are not stored: a player passes exactly when it has no valid
+    move, so replay() puts them back. A game of 60 moves takes 65 bytes.
+
+    GameWriter packs games in the caller and leaves the file writes to a
+    background thread, so a simulation loop never waits on the disk.
+    read_games() is a generator: files of millions of games are scanned
+    with one game in memory at a time.
+    Author: Duong Nguyen
+
+    Usage:
+        python gamerecord.py stats games.rec
+        python gamerecord.py show games.rec -n 3
+"""
+
+import argparse
+import collections
+import struct
+import threading
+import Queue
+
+import bitboard
+
+# CONSTANTS
+MAGIC = 'RVGR'
+VERSION = 1
+HEADER = struct.Struct('<4sIH') # magic, version, length of the strategy names
+GAME = struct.Struct('<BBBbB') # X strategy, O strategy, first mover (0: X, 1: O), X - O, moves
+SYMBOLS = 'XO'
+FLUSH_GAMES = 1000 # games packed together before they are handed to the writer thread
+READ_BUFFER = 1 << 20
+
+GameRecord = collections.namedtuple('GameRecord', 'xStrategy oStrategy first diff moves')
+
+def pack_game(strategyIndex, xStrategy, oStrategy, first, diff, moves):
+    """ Bytes of one game.
+
+        Params:
+            strategyIndex: {strategy name: index in the file's strategy list}
+            xStrategy, oStrategy: names of the strategies playing X and O.
+            first: the symbol who moved first.
+            diff: final X - O disc difference.
+            moves: the squares played, in order, passes left out.
+    """
+    return GAME.pack(strategyIndex[xStrategy], strategyIndex[oStrategy], SYMBOLS.index(first),
+                     diff, len(moves)) + str(bytearray(moves))
+
+class StrategyMismatch(ValueError):
+    """ Raised when appending to a record file whose strategy list is different."""
+    pass
+
+class GameWriter(object):
+    """ Streaming writer of game records.
+        write() only packs the game and queues it; a daemon thread appends the
+        queued chunks to the file. close() (or leaving a with block) waits for
+        everything to reach the disk.
+
+        Params:
+            fname: output file, created or appended to.
+            strategies: names of every strategy that appears in the games.
+                        Appending requires the same list as the existing file.
+            append: add to an existing file instead of truncating it.
+    """
+
+    def __init__(self, fname, strategies, append=False):
+        self.fname = fname
+        self.strategies = list(strategies)
+        self.index = dict((name, i) for i, name in enumerate(self.strategies))
+        self.games = 0
+        self.pending = []
+        header = encode_header(self.strategies)
+        if append:
+            try:
+                with open(fname, 'rb') as fin:
+                    existing = read_header(fin)
+            except IOError:
+                existing = None
+            if existing is not None and existing != self.strategies:
+                raise StrategyMismatch('%s records strategies %s, not %s' % (fname, existing, self.strategies))
+            self.fout = open(fname, 'ab')
+            if existing is None:
+                self.fout.write(header)
+        else:
+            self.fout = open(fname, 'wb')
+            self.fout.write(header)
+        self.queue = Queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._drain)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _drain(self):
+        """ Writer thread: append chunks until the None sentinel."""
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            try:
+                self.fout.write(chunk)
+            except IOError as e:
+                self.error = e
+
+    def write(self, xStrategy, oStrategy, first, diff, moves):
+        """ Record one game (see pack_game for the arguments). Never waits for the disk."""
+        self.pending.append(pack_game(self.index, xStrategy, oStrategy, first, diff, moves))
+        self.games += 1
+        if len(self.pending) >= FLUSH_GAMES:
+            self.flush()
+
+    def flush(self):
+        """ Hand the packed games to the writer thread."""
+        if self.pending:
+            self.queue.put(''.join(self.pending))
+            self.pending = []
+
+    def close(self):
+        """ Write everything out and close the file."""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.fout.close()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def encode_header(strategies):
+    names = ','.join(strategies)
+    return HEADER.pack(MAGIC, VERSION, len(names)) + names
+
+def read_header(fin):
+    """ Strategy list of an open record file, or None if the file is empty."""
+    data = fin.read(HEADER.size)
+    if not data:
+        return None
+    magic, version, n = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a version %s game record file' % (getattr(fin, 'name', fin), VERSION))
+    names = fin.read(n)
+    return names.split(',') if names else []
+
+def read_games(fname):
+    """ Generate the games of a record file, one GameRecord at a time.
+        Strategies are given by name, moves as a list of squares.
+    """
+    with open(fname, 'rb', READ_BUFFER) as fin:
+        strategies = read_header(fin)
+        if strategies is None:
+            return
+        size = GAME.size
+        while True:
+            data = fin.read(size)
+            if len(data) < size:
+                if data:
+                    raise ValueError('%s: truncated game header' % fname)
+                return
+            x, o, first, diff, n = GAME.unpack(data)
+            moves = bytearray(fin.read(n))
+            if len(moves) < n:
+                raise ValueError('%s: truncated game' % fname)
+            yield GameRecord(strategies[x], strategies[o], SYMBOLS[first], diff, list(moves))
+
+def replay(game):
+    """ Generate the positions of a recorded game, passes included.
+
+        Yields:
+            (xbits, obits, symbol to move, square played); the square is None for a pass.
+            The final position is not yielded.
+    """
+    x, o = bitboard.INIT_X, bitboard.INIT_O
+    symbol = game.first
+    for sq in game.moves:
+        own, opp = (x, o) if symbol == 'X' else (o, x)
+        if not bitboard.get_moves(own, opp):
+            yield x, o, symbol, None
+            symbol = 'O' if symbol == 'X' else 'X'
+            own, opp = opp, own
+        flips = bitboard.get_flips(own, opp, sq)
+        if not flips:
+            raise ValueError('Illegal move %s for %s' % (bitboard.coords(sq), symbol))
+        yield x, o, symbol, sq
+        own |= flips | (1 << sq)
+        opp ^= flips
+        x, o = (own, opp) if symbol == 'X' else (opp, own)
+        symbol = 'O' if symbol == 'X' else 'X'
+
+def stats(fname):
+    """ Wins/losses/ties and mean length per (X strategy, O strategy), in one pass.
+
+        Returns:
+            {(xStrategy, oStrategy): {'games', 'xwins', 'owins', 'ties', 'moves'}}
+    """
+    table = {}
+    for game in read_games(fname):
+        pair = table.setdefault((game.xStrategy, game.oStrategy),
+                                {'games': 0, 'xwins': 0, 'owins': 0, 'ties': 0, 'moves': 0})
+        pair['games'] += 1
+        pair['moves'] += len(game.moves)
+        if game.diff > 0:
+            pair['xwins'] += 1
+        elif game.diff < 0:
+            pair['owins'] += 1
+        else:
+            pair['ties'] += 1
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect Reversi game record files.')
+    parser.add_argument('command', choices=['stats', 'show'])
+    parser.add_argument('fname', help='game record file')
+    parser.add_argument('-n', '--games', type=int, default=1, help='games to show')
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        for (xs, os_), pair in sorted(stats(args.fname).items()):
+            n = pair['games']
+            print '%s (X) vs %s (O): %s games, X-O-T %s-%s-%s, %.1f moves per game' \
+                    %(xs, os_, n, pair['xwins'], pair['owins'], pair['ties'], pair['moves'] * 1. / n)
+    else:
+        for k, game in enumerate(read_games(args.fname)):
+            if k == args.games:
+                break
+            moves = ' '.join('pass' if sq is None else '%d%d' %(sq // 8 + 1, sq % 8 + 1)
+                             for _, _, _, sq in replay(game))
+            print '%s (X) vs %s (O), %s first, X - O = %+d: %s' \
+                    %(game.xStrategy, game.oStrategy, game.first, game.diff, moves)
+
+if __name__ == '__main__':
+    main()
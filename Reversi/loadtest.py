@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+""" Load test for server.py: many simulated clients playing at once.
+    Every client plays random legal moves as fast as the server answers,
+    for a number of games, over its own connection. Reports throughput,
+    response latency (from sending a command to the next BOARD or END)
+    and the server's own metrics.
+    Author: Duong Nguyen
+
+    Usage:
+        python server.py -p 7777 &
+        python loadtest.py -p 7777 -c 500 -g 2 -t 5
+"""
+
+import argparse
+import asynchat
+import asyncore
+import random
+import socket
+import time
+
+import bitboard
+from server import percentile
+
+class Client(asynchat.async_chat):
+    """ One simulated player.
+
+        Params:
+            address: server (host, port).
+            nGames: games to play before quitting.
+            gameTime: computer's seconds per game, sent with NEW.
+            rng: random stream for the moves.
+            results: shared dict the client adds its counts to.
+    """
+
+    def __init__(self, address, nGames, gameTime, rng, results):
+        asynchat.async_chat.__init__(self)
+        self.set_terminator('\n')
+        self.buffer = []
+        self.nGames = nGames
+        self.gameTime = gameTime
+        self.rng = rng
+        self.results = results
+        self.symbol = rng.choice('XO')
+        self.sentAt = None
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(address)
+
+    def handle_connect(self):
+        self.command('NEW %s %s' % (self.symbol, self.gameTime))
+
+    def command(self, line):
+        self.sentAt = time.time()
+        self.push(line + '\n')
+
+    def collect_incoming_data(self, data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        words = ''.join(self.buffer).split()
+        self.buffer = []
+        if not words:
+            return
+        reply = words[0]
+        if reply in ('BOARD', 'END') and self.sentAt is not None:
+            self.results['latency'].append(time.time() - self.sentAt)
+            self.sentAt = None
+        if reply == 'BOARD':
+            self.play(words[1])
+        elif reply == 'END':
+            self.results['games'] += 1
+            self.nGames -= 1
+            if self.nGames > 0:
+                self.command('NEW %s %s' % (self.symbol, self.gameTime))
+            else:
+                self.push('QUIT\n')
+        elif reply == 'ERR':
+            self.results['errors'] += 1
+        elif reply == 'BYE':
+            self.close()
+
+    def play(self, cells):
+        xbits = sum(1 << sq for sq, cell in enumerate(cells) if cell == 'X')
+        obits = sum(1 << sq for sq, cell in enumerate(cells) if cell == 'O')
+        own, opp = (xbits, obits) if self.symbol == 'X' else (obits, xbits)
+        r, c = bitboard.coords(self.rng.choice(list(bitboard.iter_squares(bitboard.get_moves(own, opp)))))
+        self.results['moves'] += 1
+        self.command('MOVE %d,%d' % (r + 1, c + 1))
+
+    def handle_close(self):
+        self.results['closed'] += 1
+        self.close()
+
+def server_stats(address):
+    """ The server's STATS line as a dict."""
+    sock = socket.create_connection(address)
+    try:
+        sock.sendall('STATS\nQUIT\n')
+        data = ''
+        while '\n' not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    return dict(kv.split('=', 1) for kv in data.split('\n')[0].split()[1:])
+
+def run(address, nClients, nGames, gameTime, seed=0):
+    """ Play nClients x nGames games against the server. Returns the results dict."""
+    results = {'games': 0, 'moves': 0, 'errors': 0, 'closed': 0, 'latency': []}
+    rng = random.Random(seed)
+    start = time.time()
+    for _ in xrange(nClients):
+        Client(address, nGames, gameTime, random.Random(rng.getrandbits(32)), results)
+    asyncore.loop(timeout=1., use_poll=True)
+    results['secs'] = time.time() - start
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the Reversi game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=7777)
+    parser.add_argument('-c', '--clients', type=int, default=100, help='concurrent sessions')
+    parser.add_argument('-g', '--games', type=int, default=1, help='games per session')
+    parser.add_argument('-t', '--game-time', type=float, default=5., help="computer's seconds per game")
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    address = (args.host, args.port)
+    res = run(address, args.clients, args.games, args.game_time, args.seed)
+    lat = res['latency']
+    print '%d clients: %d games, %d moves in %.1f s (%.1f games/s), %d errors' \
+            %(args.clients, res['games'], res['moves'], res['secs'], res['games'] / res['secs'], res['errors'])
+    print 'response latency: p50 %.3f s, p90 %.3f s, p99 %.3f s, max %.3f s' \
+            %(percentile(lat, 50), percentile(lat, 90), percentile(lat, 99), max(lat) if lat else 0.)
+    print 'server: ' + ' '.join('%s=%s' % kv for kv in sorted(server_stats(address).items()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/python
+
+""" Monte Carlo Tree Search (UCT) player for Reversi (Othello) on bitboards.
+    Random or heavy playouts, a playout or time budget per move, tree reuse
+    between moves, and root parallelism across worker processes.
+    Author: Duong Nguyen
+
+    Usage: python mcts.py -p 2000 -w 4
+"""
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+
+import bitboard
+
+# CONSTANTS
+UCT_C = 1.4 # exploration constant
+PASS = -1 # the move of a player without a legal move
+XSQUARES = (1 << 9) | (1 << 14) | (1 << 49) | (1 << 54)
+
+class Node(object):
+    """ A search tree node: a position with the player owning `own` to move.
+        `wins` counts playout results for the player who moved into this node.
+    """
+    __slots__ = ('own', 'opp', 'move', 'parent', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, own, opp, move=None, parent=None):
+        self.own = own
+        self.opp = opp
+        self.move = move
+        self.parent = parent
+        self.children = []
+        moves = bitboard.get_moves(own, opp)
+        if moves:
+            self.untried = list(bitboard.iter_squares(moves))
+        elif bitboard.get_moves(opp, own):
+            self.untried = [PASS]
+        else: # game over
+            self.untried = []
+        self.visits = 0
+        self.wins = 0.
+
+    def play(self, move):
+        """ Position after `move`, as (own, opp) for the next player."""
+        if move == PASS:
+            return self.opp, self.own
+        flips = bitboard.get_flips(self.own, self.opp, move)
+        return self.opp ^ flips, self.own | flips | (1 << move)
+
+    def select_child(self, c=UCT_C):
+        """ The child with the highest UCT value."""
+        logN = math.log(self.visits)
+        best, bestValue = None, -1.
+        for child in self.children:
+            value = child.wins / child.visits + c * math.sqrt(logN / child.visits)
+            if value > bestValue:
+                best, bestValue = child, value
+        return best
+
+def random_playout(own, opp, rng):
+    """ Play uniformly random moves to the end of the game.
+
+        Returns:
+            Final disc difference for the player owning `own`.
+    """
+    sign = 1
+    passed = False
+    get_moves, get_flips = bitboard.get_moves, bitboard.get_flips
+    while True:
+        moves = get_moves(own, opp)
+        if moves:
+            sq = rng.choice(list(bitboard.iter_squares(moves)))
+            flips = get_flips(own, opp, sq)
+            own, opp = opp ^ flips, own | flips | (1 << sq)
+            passed = False
+        elif passed:
+            break
+        else:
+            own, opp = opp, own
+            passed = True
+        sign = -sign
+    return sign * (bitboard.popcount(own) - bitboard.popcount(opp))
+
+def heavy_playout(own, opp, rng):
+    """ Like random_playout, but take a corner when possible and avoid X-squares."""
+    sign = 1
+    passed = False
+    get_moves, get_flips = bitboard.get_moves, bitboard.get_flips
+    while True:
+        moves = get_moves(own, opp)
+        if moves:
+            if moves & bitboard.CORNERS:
+                moves &= bitboard.CORNERS
+            elif moves & ~XSQUARES:
+                moves &= ~XSQUARES
+            sq = rng.choice(list(bitboard.iter_squares(moves)))
+            flips = get_flips(own, opp, sq)
+            own, opp = opp ^ flips, own | flips | (1 << sq)
+            passed = False
+        elif passed:
+            break
+        else:
+            own, opp = opp, own
+            passed = True
+        sign = -sign
+    return sign * (bitboard.popcount(own) - bitboard.popcount(opp))
+
+PLAYOUTS = {'random': random_playout, 'heavy': heavy_playout}
+
+class MCTSPlayer(object):
+    """ UCT player.
+
+        Params:
+            playouts: playouts per move (ignored if timeLimit is set).
+            timeLimit: seconds per move, or None to use the playout budget.
+            playout: 'random' or 'heavy'.
+            workers: worker processes for root parallelism. Each builds its own
+                     tree and the root statistics are summed. 1 searches in this
+                     process and keeps the tree between moves.
+            seed: random seed.
+
+        After get_move(), `playoutsDone` and `secs` describe the last search.
+    """
+
+    def __init__(self, playouts=1000, timeLimit=None, playout='random', workers=1, seed=None):
+        self.playouts = playouts
+        self.timeLimit = timeLimit
+        self.playout = playout
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.root = None
+        self.pool = None
+        self.playoutsDone = 0
+        self.secs = 0.
+
+    def close(self):
+        """ Stop the worker processes, if any."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def playouts_per_sec(self):
+        return self.playoutsDone / self.secs if self.secs else 0.
+
+    def get_move(self, own, opp):
+        """ Best move for the player owning `own`, or None if they must pass."""
+        start = time.time()
+        if not bitboard.get_moves(own, opp):
+            return None
+        if self.workers > 1:
+            stats = self._parallel_stats(own, opp)
+        else:
+            root = self._reuse_root(own, opp)
+            self.playoutsDone = run_search(root, self.playouts, self.timeLimit,
+                                           PLAYOUTS[self.playout], self.rng)
+            stats = dict((child.move, (child.visits, child.wins)) for child in root.children)
+        self.secs = time.time() - start
+        return max(stats, key=lambda move: stats[move][0])
+
+    def _reuse_root(self, own, opp):
+        """ Continue from the subtree of this position if the last tree reached it."""
+        root = None
+        if self.root is not None: # look two plies down: our move, then the reply
+            for child in self.root.children:
+                for grandchild in child.children:
+                    if grandchild.own == own and grandchild.opp == opp:
+                        root = grandchild
+        if root is None:
+            root = Node(own, opp)
+        root.parent = None
+        self.root = root
+        return root
+
+    def _parallel_stats(self, own, opp):
+        """ Root parallelism: independent searches merged by move."""
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers)
+        tasks = [(own, opp, max(1, self.playouts // self.workers), self.timeLimit, self.playout,
+                  self.rng.getrandbits(32)) for _ in xrange(self.workers)]
+        stats = {}
+        self.playoutsDone = 0
+        for done, workerStats in self.pool.map(_worker_search, tasks):
+            self.playoutsDone += done
+            for move, (visits, wins) in workerStats.items():
+                v, w = stats.get(move, (0, 0.))
+                stats[move] = (v + visits, w + wins)
+        return stats
+
+def run_search(root, playouts, timeLimit, playout, rng):
+    """ Grow the tree below root. Stops after `playouts` playouts, or at the
+        time limit if one is given; there is always at least one playout, so
+        that the root has a child to choose.
+
+        Returns:
+            Number of playouts run.
+    """
+    deadline = None if timeLimit is None else time.time() + timeLimit
+    done = 0
+    while True:
+        # selection
+        node = root
+        while not node.untried and node.children:
+            node = node.select_child()
+        # expansion
+        if node.untried:
+            move = node.untried.pop(rng.randrange(len(node.untried)))
+            own, opp = node.play(move)
+            child = Node(own, opp, move, node)
+            node.children.append(child)
+            node = child
+        # simulation: result for the player to move at `node`
+        diff = playout(node.own, node.opp, rng)
+        result = 1. if diff < 0 else 0.5 if diff == 0 else 0. # for the player who moved into node
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            node.wins += result
+            result = 1. - result
+            node = node.parent
+        done += 1
+        if deadline is None:
+            if done >= playouts:
+                break
+        elif (done == 1 or done % 16 == 0) and time.time() > deadline: # 1: deadline already gone
+            break
+    return done
+
+def _worker_search(task):
+    """ Worker: build one tree and return (playouts, {move: (visits, wins)}) at the root."""
+    own, opp, playouts, timeLimit, playout, seed = task
+    root = Node(own, opp)
+    done = run_search(root, playouts, timeLimit, PLAYOUTS[playout], random.Random(seed))
+    return done, dict((child.move, (child.visits, child.wins)) for child in root.children)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure MCTS playout throughput from the initial position.')
+    parser.add_argument('-p', '--playouts', type=int, default=2000, help='playouts per move')
+    parser.add_argument('-t', '--time', type=float, default=None, help='seconds per move instead of a playout budget')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='worker processes (root parallelism)')
+    parser.add_argument('--heavy', action='store_true', help='use heavy playouts')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    player = MCTSPlayer(args.playouts, args.time, 'heavy' if args.heavy else 'random', args.workers, args.seed)
+    sq = player.get_move(bitboard.INIT_X, bitboard.INIT_O)
+    player.close()
+    print 'move %s: %s playouts in %.2f s (%.0f playouts/s)' \
+            %(bitboard.coords(sq), player.playoutsDone, player.secs, player.playouts_per_sec())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+
+""" Opening book for Reversi (Othello).
+    Move statistics of early positions, gathered from simulated games and
+    stored as an open-addressing hash table in a binary file.
+    The file is memory-mapped at load, so a lookup is a few probes
+    with no parsing and no per-process copy of the table.
+    Positions are stored in canonical form (symmetry.py), so the 8
+    symmetric versions of an opening share one set of statistics.
+    Author: Duong Nguyen
+
+    Usage:
+        python opening_book.py build -n 20000 -p 10 -o opening.book
+        python opening_book.py show -o opening.book
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+
+import bitboard
+import symmetry
+
+# CONSTANTS
+MAGIC = 'RVBK'
+VERSION = 2 # 2: positions in canonical form
+HEADER = struct.Struct('<4sIIII') # magic, version, nslots, nentries, maxDiscs
+# canonical own, opp, move square in canonical coordinates, (padding), games, sum of final disc diffs for the mover
+RECORD = struct.Struct('<QQB3xIi')
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening.book')
+MIN_GAMES = 5 # moves seen less often than this are not trusted
+
+def slot_index(own, opp, bits):
+    """ Home slot of a position in a table of 2**bits slots.
+        Multiplicative hashing: the top bits of the product mix every input bit.
+    """
+    h = ((own * 0x9E3779B97F4A7C15) ^ (opp * 0xC2B2AE3D27D4EB4F)) & bitboard.FULL
+    return h >> (64 - bits)
+
+class OpeningBook(object):
+    """ Read-only, memory-mapped opening book.
+
+        Params:
+            fname: book file written by write_book().
+    """
+
+    def __init__(self, fname=BOOK_FILE):
+        self.fname = fname
+        with open(fname, 'rb') as fin:
+            self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.nslots, self.nentries, self.maxDiscs = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %s opening book' % (fname, VERSION))
+        self.mask = self.nslots - 1
+        self.bits = self.nslots.bit_length() - 1
+
+    def __len__(self):
+        return self.nentries
+
+    def close(self):
+        self.data.close()
+
+    def lookup(self, own, opp):
+        """ Move statistics of a position, from the point of view of the player to move.
+
+            Returns:
+                A list of (square, games, scoreSum), empty if the position is not in the book.
+        """
+        if bitboard.popcount(own | opp) > self.maxDiscs:
+            return []
+        own, opp, t = symmetry.canonical(own, opp)
+        back = symmetry.SQUARE_MAP[symmetry.INVERSE[t]]
+        stab = symmetry.stabilizer(own, opp)
+        found = []
+        i = slot_index(own, opp, self.bits)
+        data, unpack, size = self.data, RECORD.unpack_from, RECORD.size
+        while True: # entries of one position all lie on its probe chain
+            rOwn, rOpp, sq, games, scoreSum = unpack(data, HEADER.size + i * size)
+            if not games: # empty slot: end of the chain
+                return found
+            if rOwn == own and rOpp == opp:
+                for eq in set(symmetry.SQUARE_MAP[j][sq] for j in stab): # equivalent moves
+                    found.append((back[eq], games, scoreSum))
+            i = (i + 1) & self.mask
+
+    def best_move(self, own, opp, minGames=MIN_GAMES):
+        """ The book move with the best mean result, or None if the book has no advice."""
+        best = None
+        bestMean = None
+        for sq, games, scoreSum in self.lookup(own, opp):
+            if games < minGames:
+                continue
+            mean = scoreSum * 1. / games
+            if best is None or mean > bestMean:
+                best, bestMean = sq, mean
+        return best
+
+def write_book(fname, stats):
+    """ Write move statistics to a book file.
+
+        Params:
+            fname: output file.
+            stats: {(own, opp, square): [games, scoreSum]}, positions in canonical form
+    """
+    nslots = 1
+    while nslots < 2 * len(stats): # keep the load factor at most 1/2
+        nslots *= 2
+    maxDiscs = 0
+    buf = bytearray(HEADER.size + nslots * RECORD.size)
+    mask = nslots - 1
+    bits = nslots.bit_length() - 1
+    for (own, opp, sq), (games, scoreSum) in sorted(stats.items()):
+        maxDiscs = max(maxDiscs, bitboard.popcount(own | opp))
+        i = slot_index(own, opp, bits)
+        while RECORD.unpack_from(buf, HEADER.size + i * RECORD.size)[3]: # slot taken
+            i = (i + 1) & mask
+        RECORD.pack_into(buf, HEADER.size + i * RECORD.size, own, opp, sq, games, scoreSum)
+    HEADER.pack_into(buf, 0, MAGIC, VERSION, nslots, len(stats), maxDiscs)
+    with open(fname, 'wb') as fout:
+        fout.write(buf)
+
+def _default_strategy(own, opp):
+    """ Greedy play (most discs after the move) used to finish book games."""
+    best, bestCount = None, -1
+    for sq in bitboard.iter_squares(bitboard.get_moves(own, opp)):
+        n = bitboard.popcount(bitboard.get_flips(own, opp, sq))
+        if n > bestCount:
+            best, bestCount = sq, n
+    return best
+
+def build_stats(nGames, plies=10, seed=0, strategy=_default_strategy):
+    """ Gather move statistics from simulated games.
+        The first `plies` moves of each game are random, to explore openings;
+        `strategy(own, opp) -> square` plays the rest. Either colour may move
+        first, as with who_goes_first in the game programs.
+
+        Returns:
+            {(own, opp, square): [games, scoreSum]} where scoreSum adds up the
+            final disc differential from the point of view of the player who moved.
+            Positions and squares are in canonical form (see symmetry.canonical).
+    """
+    rng = random.Random(seed)
+    stats = {}
+    for _ in xrange(nGames):
+        own, opp = bitboard.INIT_X, bitboard.INIT_O
+        if rng.random() < 0.5:
+            own, opp = opp, own
+        history = [] # (own, opp, square, movedAsFirstPlayer)
+        first = True # own belongs to the player who moved first
+        ply = 0
+        while True:
+            moves = bitboard.get_moves(own, opp)
+            if not moves:
+                if not bitboard.get_moves(opp, own):
+                    break
+                own, opp, first = opp, own, not first # pass
+                continue
+            if ply < plies:
+                sq = rng.choice(list(bitboard.iter_squares(moves)))
+                cOwn, cOpp, t = symmetry.canonical(own, opp)
+                cSq = symmetry.SQUARE_MAP[t][sq]
+                # in a symmetric position, equivalent moves count as one
+                cSq = min(symmetry.SQUARE_MAP[j][cSq] for j in symmetry.stabilizer(cOwn, cOpp))
+                history.append((cOwn, cOpp, cSq, first))
+            else:
+                sq = strategy(own, opp)
+            flips = bitboard.get_flips(own, opp, sq)
+            own, opp, first = opp ^ flips, own | flips | (1 << sq), not first
+            ply += 1
+        diff = bitboard.popcount(own) - bitboard.popcount(opp) # for the side `first` says
+        for hOwn, hOpp, sq, hFirst in history:
+            entry = stats.setdefault((hOwn, hOpp, sq), [0, 0])
+            entry[0] += 1
+            entry[1] += diff if hFirst == first else -diff
+    return stats
+
+def load_default():
+    """ The default book if BOOK_FILE exists, else None."""
+    if os.path.exists(BOOK_FILE):
+        try:
+            return OpeningBook(BOOK_FILE)
+        except ValueError: # a book from an older version: rebuild it
+            return None
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect a Reversi opening book.')
+    parser.add_argument('command', choices=['build', 'show'])
+    parser.add_argument('-o', '--output', default=BOOK_FILE, help='book file')
+    parser.add_argument('-n', '--games', type=int, default=20000, help='games to simulate')
+    parser.add_argument('-p', '--plies', type=int, default=10, help='book depth in plies')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        stats = build_stats(args.games, args.plies, args.seed)
+        write_book(args.output, stats)
+        print 'Wrote %s entries to %s' %(len(stats), args.output)
+    else:
+        book = OpeningBook(args.output)
+        print '%s: %s entries in %s slots, up to %s discs' %(args.output, len(book), book.nslots, book.maxDiscs)
+        for own, opp in ((bitboard.INIT_X, bitboard.INIT_O), (bitboard.INIT_O, bitboard.INIT_X)):
+            for sq, games, scoreSum in sorted(book.lookup(own, opp)):
+                print '  move %s: %s games, mean disc diff %+.2f' %(bitboard.coords(sq), games, scoreSum * 1. / games)
+        book.close()
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,25 @@
 import random
 import sys
 
+import bitboard
+import clock
+import endgame
+import opening_book
+import patterns
+import search
+import transposition
+
+# opening book consulted first by get_computer_move (None: no book file)
+BOOK = opening_book.load_default()
+# get_computer_move plays perfectly from this many empty squares on
+ENDGAME_EMPTIES = endgame.EMPTIES
+ENDGAME_SOLVER = endgame.EndgameSolver()
+# computer thinking time in main(): seconds per game and at most per move
+GAME_TIME = 60.
+MOVE_TIME = 5.
+SEARCH_TABLE_MB = 16
+SEARCH_TABLE = transposition.TranspositionTable(sizeMB=SEARCH_TABLE_MB)
+
 # BOARD-RELATED FUNCTIONS
 def draw_board(board):
     """ Print the current game board (text-based).
@@ -20,15 +39,15 @@ def draw_board(board):
     """
     nr = len(board)
     nc = len(board[0])
-    colNames = map(str, range(1, nc+1)) # column names: '1',...'nc'
+    colNames = [str(c).center(3) for c in range(1, nc+1)] # column names: '1',...'nc'
     HLINE = ' ' * 3 + '---'.join(['+'] * (nc+1))
     VLINE = ' ' * 3 + (' ' * 3).join(['|'] * (nc+1))
     
-    print ' ' * 5 + (' ' * 3).join(colNames)
+    print ' ' * 4 + ' '.join(colNames)
     print HLINE
     for r in range(nr):
         print VLINE
-        print "%d " %(r+1),
+        print "%-2d" %(r+1),
         for c in range(nc):
             print '| %s' %(board[r][c]),
         print '|'
@@ -122,6 +141,37 @@ def get_score_from_board(board):
 # END BOARD-RELATED FUNCTIONS
 
 # MOVE-RELATED FUNCTIONS
+DIRECTIONS = [[0,1],[0,-1],[1,1],[1,0],[1,-1],[-1,1],[-1,0],[-1,-1]]
+_RAYS = {} # (nr, nc) -> ray table, see get_rays
+
+def get_rays(nr, nc):
+    """ Ray table of an nr x nc board, built once per board shape.
+        
+        Params:
+            nr, nc: board size.
+        
+        Returns:
+            rays: rays[r][c] lists, for every direction, the cells (r', c') 
+            going away from (r,c) up to the board edge. Rays shorter than
+            2 cells are left out: they can never flip anything.
+    """
+    rays = _RAYS.get((nr, nc))
+    if rays is None:
+        rays = [[[] for _ in range(nc)] for _ in range(nr)]
+        for r in range(nr):
+            for c in range(nc):
+                for dr, dc in DIRECTIONS:
+                    ray = []
+                    cur_r, cur_c = r + dr, c + dc
+                    while 0 <= cur_r < nr and 0 <= cur_c < nc:
+                        ray.append((cur_r, cur_c))
+                        cur_r += dr
+                        cur_c += dc
+                    if len(ray) >= 2:
+                        rays[r][c].append(tuple(ray))
+        _RAYS[(nr, nc)] = rays
+    return rays
+
 def is_on_board(board, r, c):
     """ Check if (r,c) is located on the board.
         
@@ -166,42 +216,27 @@ def is_valid_move(board, symbol, r, c):
             A (non-empty) list of cells to flip if this move is valid.
             False if this move is invalid.
     """
-    if board[r][c] != ' ' or not is_on_board(board, r, c):
+    if not is_on_board(board, r, c) or board[r][c] != ' ':
         return False
     
-    board[r][c] = symbol # temporarily set the symbol on the board
-    
     if symbol == 'X':
         opponent = 'O'
     else:
         opponent = 'X'
     
     cellsToFlip = [] # list of cells to flip after this move
-    for dr, dc in [[0,1],[0,-1],[1,1],[1,0],[1,-1],[-1,1],[-1,0],[-1,-1]]:
-        cur_r, cur_c = r, c
-        cur_r += dr
-        cur_c += dc
-        if is_on_board(board, cur_r, cur_c) and board[cur_r][cur_c] == opponent:
-            cur_r += dr
-            cur_c += dc
-            if not is_on_board(board, cur_r, cur_c):
-                continue
-            while board[cur_r][cur_c] == opponent:
-                cur_r += dr
-                cur_c += dc
-                if not is_on_board(board, cur_r, cur_c):
-                    break
-            if not is_on_board(board, cur_r, cur_c):
-                continue
-            if board[cur_r][cur_c] == symbol: # valid move
-                while True: # backtrack to get flip cells
-                    cur_r -= dr
-                    cur_c -= dc
-                    if cur_r == r and cur_c == c:
-                        break
-                    cellsToFlip.append([cur_r, cur_c])
+    for ray in get_rays(len(board), len(board[0]))[r][c]: # precomputed, always on the board
+        cur_r, cur_c = ray[0]
+        if board[cur_r][cur_c] != opponent:
+            continue
+        for i in range(1, len(ray)):
+            cur_r, cur_c = ray[i]
+            cell = board[cur_r][cur_c]
+            if cell != opponent:
+                if cell == symbol: # valid move: flip the opponent run
+                    cellsToFlip.extend(ray[:i])
+                break
         
-    board[r][c] = ' ' # restore to empty cell
     if len(cellsToFlip) == 0: # no cell to flip, then invalid move
         return False
     return cellsToFlip
@@ -222,7 +257,7 @@ def get_valid_moves(board, symbol):
     nc = len(board[0])
     for r in range(nr):
         for c in range(nc):
-            if is_valid_move(board, symbol, r, c) != False:
+            if board[r][c] == ' ' and is_valid_move(board, symbol, r, c) != False:
                 validMoves.append([r,c])
     return validMoves
 
@@ -249,9 +284,9 @@ def select_symbol():
     else:
         return ['O', 'X']
     
-def who_goes_first():
+def who_goes_first(rng=random):
     """ Decide who (user or computer) will play first."""
-    if random.randint(0,1) == 0:
+    if rng.randint(0,1) == 0:
         return 'computer'
     else:
         return 'player'
@@ -274,7 +309,7 @@ def make_move(board, symbol, r, c):
             r, c: coordinates of the move.
             
         Returns:
-            True if move successfully.
+            The undo record (the non-empty list of flipped cells) if move successfully.
             False if otherwise.
     """
     # First, check the validity of this move
@@ -286,7 +321,27 @@ def make_move(board, symbol, r, c):
     board[r][c] = symbol
     for fr, fc in cellsToFlip:
         board[fr][fc] = symbol
-    return True
+    return cellsToFlip
+
+def unmake_move(board, symbol, r, c, cellsToFlip):
+    """ Take back a move made by make_move.
+        
+        Params:
+            board: current game board.
+            symbol: the player who made the move.
+            r, c: coordinates of the move.
+            cellsToFlip: the undo record returned by make_move.
+            
+        Returns:
+            None
+    """
+    if symbol == 'X':
+        opponent = 'O'
+    else:
+        opponent = 'X'
+    board[r][c] = ' '
+    for fr, fc in cellsToFlip:
+        board[fr][fc] = opponent
 
 def get_player_move(board, playerSymbol):
     """ Get player's input:
@@ -305,15 +360,18 @@ def get_player_move(board, playerSymbol):
     ROWS = map(str, range(1, nr+1))
     COLS = map(str, range(1, nc+1))
     while True:
-        print "Enter your move [r,c] coordinates, or 'quit' to end the game, or 'hints' to turn off/on hints."
-        move = raw_input().lower()
+        print "Enter your move as r,c (e.g. 3,4 or 12,10), or 'quit' to end the game, or 'hints' to turn off/on hints."
+        move = raw_input().lower().strip()
         if move == 'quit':
             return 'quit'
         if move == 'hints':
             return 'hints'
-        if len(move) == 2 and move[0] in ROWS and move[1] in COLS:
-            r = int(move[0]) - 1
-            c = int(move[1]) - 1
+        parts = move.replace(',', ' ').split()
+        if len(parts) == 1 and len(move) == 2 and nr < 10 and nc < 10: # old style: 34
+            parts = list(move)
+        if len(parts) == 2 and parts[0] in ROWS and parts[1] in COLS:
+            r = int(parts[0]) - 1
+            c = int(parts[1]) - 1
             if is_valid_move(board, playerSymbol, r, c) == False:
                 continue
             else:
@@ -324,34 +382,80 @@ def get_player_move(board, playerSymbol):
             
     return [r,c]
     
-def get_computer_move(board, computerSymbol):
+def get_computer_move(board, computerSymbol, rng=random, gameClock=None):
     """ Given the current board and computerSymbol, 
         decide computer's next move (AI part)
         
         Params:
             board: the current game board.
             computerSymbol: computer symbol ('X' or 'O')
+            rng: random stream for tie-breaking. Default: the random module.
+            gameClock: clock.GameClock with the computer's time budget; the
+                       move (nodes, depth, time used) is logged on it.
+                       None: no time limit, and no search.
             
         Returns:
             A list of moves.
     """
+    if gameClock is None:
+        gameClock = clock.GameClock()
+    gameClock.start(sum(row.count(' ') for row in board))
+    move, source, nodes, depth = choose_computer_move(board, computerSymbol, rng, gameClock)
+    gameClock.stop(move, source, nodes, depth)
+    return move
+
+def choose_computer_move(board, computerSymbol, rng, gameClock):
+    """ The move of get_computer_move, within the deadline set on gameClock.
+        On 8x8 boards: the opening book, then the endgame solver, then (with a
+        time budget) alpha-beta search. Otherwise, or if the endgame solver
+        runs out of time: a corner, else the move flipping the most discs.
+        
+        Returns:
+            (move, source, nodes, depth): source is 'book', 'endgame',
+            'search' or 'heuristic'.
+    """
+    if len(board) == len(board[0]) == bitboard.SIZE:
+        xbits, obits = bitboard.from_rows(board)
+        if computerSymbol == 'X':
+            own, opp = xbits, obits
+        else:
+            own, opp = obits, xbits
+        if BOOK is not None:
+            sq = BOOK.best_move(own, opp)
+            if sq is not None:
+                return bitboard.coords(sq), 'book', 0, 0
+        empties = bitboard.popcount(~(own | opp) & bitboard.FULL)
+        if empties <= ENDGAME_EMPTIES:
+            try:
+                sq, _ = ENDGAME_SOLVER.solve(own, opp, gameClock.time_left())
+                return bitboard.coords(sq), 'endgame', ENDGAME_SOLVER.nodes, empties
+            except search.SearchTimeout:
+                pass # out of time: fall back to the heuristic
+        elif gameClock.budget is not None:
+            searcher = search.Searcher(timeLimit=gameClock.time_left(),
+                                       evaluate=patterns.evaluate, table=SEARCH_TABLE)
+            sq, _ = searcher.search(own, opp)
+            return bitboard.coords(sq), 'search', searcher.nodes, searcher.depth
+        
     possibleMoves = get_valid_moves(board, computerSymbol)
-    random.shuffle(possibleMoves)
+    rng.shuffle(possibleMoves)
     for r, c in possibleMoves:
         if is_corner(board, r, c): # choose a corner if possible
-            return [r, c]
+            return [r, c], 'heuristic', len(possibleMoves), 1
         
     # try all possible moves, get the best move with highest score.
+    # The score after a move is the current count plus the placed and flipped discs.
     bestScore = -1
+    curScore = get_score_from_board(board)[computerSymbol]
     for r, c in possibleMoves: 
-        cBoard = get_board_copy(board)
-        make_move(cBoard, computerSymbol, r, c)
-        score = get_score_from_board(board)[computerSymbol]
+        cellsToFlip = make_move(board, computerSymbol, r, c)
+        score = curScore + 1 + len(cellsToFlip)
+        unmake_move(board, computerSymbol, r, c, cellsToFlip)
         if score > bestScore: # update best score so far
             bestMove = [r, c]
             bestScore = score
             
-    return bestMove
+    return bestMove, 'heuristic', len(possibleMoves), 1
 
 def show_points(board, playerSymbol, computerSymbol):
     """ Show current player and computer scores."""
@@ -362,21 +466,25 @@ def show_help():
     """ Show help info, such as how to play, etc."""
     print 'This is Reversi game.\nCheck Wikipedia page for the detailed rule.'
 
-def main():
+def main(nr=8, nc=8, gameTime=GAME_TIME, moveTime=MOVE_TIME):
     """ Main program for Othello game.
         Text-based user interface. 
         @todo: GUI version
+        
+        Params:
+            nr, nc: board size, any even numbers. Default: 8 x 8
+            gameTime, moveTime: the computer's thinking time in seconds,
+                                per game and at most per move.
     """
     
-    NROWS = 8
-    NCOLS = 8
     print 'Welcome to Reversi World!'
 
     while True:
-        mainBoard = get_blank_board(nr=NROWS, nc=NCOLS)
+        mainBoard = get_blank_board(nr=nr, nc=nc)
         init_board(mainBoard)
         playerSymbol, computerSymbol = select_symbol()
         showHints = False
+        computerClock = clock.GameClock(gameTime, moveTime)
         turn = who_goes_first()
         print 'The ' + turn + ' will go first!'
         
@@ -398,22 +506,29 @@ def main():
                     continue
                 else:
                     make_move(mainBoard, playerSymbol, move[0], move[1])
-                if get_valid_moves(mainBoard, computerSymbol) == []: # can't make a move
-                    break
-                else:
+                if get_valid_moves(mainBoard, computerSymbol) != []:
                     turn = 'computer'
+                elif get_valid_moves(mainBoard, playerSymbol) != []: # computer can't make a move
+                    print 'The computer has no valid move and passes.'
+                else: # nobody can move
+                    break
             
             else:
                 draw_board(mainBoard)
                 show_points(mainBoard, playerSymbol, computerSymbol)
                 raw_input("Press Enter to see the computer's move.")
                 
-                r,c = get_computer_move(mainBoard, computerSymbol)
+                r,c = get_computer_move(mainBoard, computerSymbol, gameClock=computerClock)
                 make_move(mainBoard, computerSymbol, r, c)
-                if get_valid_moves(mainBoard, playerSymbol) == []:
-                    break
-                else:
+                log = computerClock.log[-1]
+                print 'The computer plays %d,%d (%s: %s nodes, depth %s, %.2f s).' \
+                        %(r+1, c+1, log['source'], log['nodes'], log['depth'], log['secs'])
+                if get_valid_moves(mainBoard, playerSymbol) != []:
                     turn = 'player'
+                elif get_valid_moves(mainBoard, computerSymbol) != []: # player can't make a move
+                    print 'You have no valid move and pass.'
+                else: # nobody can move
+                    break
         
         draw_board(mainBoard)
         scores = get_score_from_board(mainBoard)
@@ -424,10 +539,13 @@ def main():
             print 'You lost by %s points!' %(scores[computerSymbol]-scores[playerSymbol])
         else:
             print 'The game was a tie!'
+        print 'The computer thought for %.1f s: %.2f s per move at the median, %.2f s at the 99th percentile.' \
+                %(sum(log['secs'] for log in computerClock.log), computerClock.percentile(50), computerClock.percentile(99))
         
         if not play_again():
             print 'Goodbye. See you again!'
             break
         
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # optional board size: python othello.py [rows cols]
+    main(*map(int, sys.argv[1:3]))
\ No newline at end of file
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+
+""" Pattern-based evaluation for Reversi (Othello).
+    The board is covered by pattern instances (4 edges, 4 corner 3x3 blocks,
+    2 main diagonals). The contents of an instance is a base-3 code
+    (digit 0 empty, 1 own disc, 2 opponent disc, cell i weighted 3**i),
+    and its value is read from a precomputed table of its pattern type.
+    Evaluation = sum of table lookups + a mobility term.
+    Tables trained by train.py are loaded from WEIGHTS_FILE if it exists.
+    Author: Duong Nguyen
+"""
+
+import json
+import os
+
+import bitboard
+
+# CONSTANTS
+MOBILITY_WEIGHT = 3
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patterns.json')
+COL0 = 0x0101010101010101
+COL_MAGIC = 0x0102040810204080 # gathers column 0 into the top byte
+DIAG = 0x8040201008040201 # (0,0) .. (7,7)
+ANTI_DIAG = 0x0102040810204080 # (0,7) .. (7,0)
+BYTE_MAGIC = 0x0101010101010101 # gathers one bit per column into the top byte
+
+# pattern type -> list of instances; an instance lists its squares in digit
+# order. Edges and diagonals run from corner to corner, corner blocks start at
+# the corner and go row by row away from it.
+def _corner_block(r0, c0, dr, dc):
+    return [(r0 + dr * i) * 8 + c0 + dc * j for i in xrange(3) for j in xrange(3)]
+
+PATTERNS = {
+    'edge': [range(0, 8), range(56, 64), range(0, 64, 8), range(7, 64, 8)],
+    'corner': [_corner_block(0, 0, 1, 1), _corner_block(0, 7, 1, -1),
+               _corner_block(7, 0, -1, 1), _corner_block(7, 7, -1, -1)],
+    'diag': [range(0, 64, 9), range(7, 57, 7)],
+}
+PATTERN_TYPES = ('edge', 'corner', 'diag')
+
+# raw bit extractors, one per instance, in the same order as PATTERNS[type]
+EXTRACTORS = {
+    'edge': [lambda b: b & 0xFF,
+             lambda b: b >> 56,
+             lambda b: ((b & COL0) * COL_MAGIC & bitboard.FULL) >> 56,
+             lambda b: (((b >> 7) & COL0) * COL_MAGIC & bitboard.FULL) >> 56],
+    'corner': [lambda b: (b & 7) | ((b >> 5) & 0x38) | ((b >> 10) & 0x1C0),
+               lambda b: ((b >> 5) & 7) | ((b >> 10) & 0x38) | ((b >> 15) & 0x1C0),
+               lambda b: ((b >> 56) & 7) | ((b >> 45) & 0x38) | ((b >> 34) & 0x1C0),
+               lambda b: ((b >> 61) & 7) | ((b >> 50) & 0x38) | ((b >> 39) & 0x1C0)],
+    'diag': [lambda b: ((b & DIAG) * BYTE_MAGIC & bitboard.FULL) >> 56,
+             lambda b: ((b & ANTI_DIAG) * BYTE_MAGIC & bitboard.FULL) >> 56],
+}
+
+def _build_ternary(cells, extract):
+    """ Map raw extracted bits -> sum of 3**i over the pattern cells i that are set."""
+    rawBit = [extract(1 << sq).bit_length() - 1 for sq in cells]
+    nbits = max(rawBit) + 1
+    table = [0] * (1 << nbits)
+    for raw in xrange(1 << nbits):
+        table[raw] = sum(3 ** i for i, bit in enumerate(rawBit) if raw >> bit & 1)
+    return table
+
+# TERNARY[type][k][raw]: digit-1 contribution of instance k's raw bits
+TERNARY = dict((t, [_build_ternary(cells, ex) for cells, ex in zip(PATTERNS[t], EXTRACTORS[t])])
+               for t in PATTERN_TYPES)
+
+def decode(code, n):
+    """ Digits of a base-3 code, cell 0 first."""
+    digits = []
+    for _ in xrange(n):
+        digits.append(code % 3)
+        code //= 3
+    return digits
+
+def _sign(d):
+    return (0, 1, -1)[d]
+
+def edge_value(d):
+    """ Hand-tuned value of an edge, corner to corner: corners, C-squares next
+        to an empty corner, and discs anchored to a corner (stable).
+    """
+    value = 0
+    for i, w in enumerate((20, -4, 2, 1, 1, 2, -4, 20)):
+        value += w * _sign(d[i])
+    for corner, c in ((0, 1), (7, 6)):
+        if d[corner] and d[c]: # C-square no longer dangerous
+            value += 4 * _sign(d[c])
+    for run in (d, d[::-1]): # stable discs from each corner
+        if run[0]:
+            for x in run[1:]:
+                if x != run[0]:
+                    break
+                value += 3 * _sign(x)
+    return value
+
+def corner_value(d):
+    """ Hand-tuned value of a 3x3 corner block (corner cell is in the edges):
+        X-square next to an empty corner is bad, inner cells slightly good.
+    """
+    value = 0
+    if not d[0]:
+        value -= 10 * _sign(d[4])
+    for i in (5, 7, 8):
+        value += _sign(d[i])
+    return value
+
+def diag_value(d):
+    """ Hand-tuned value of a main diagonal (ends and X-squares are elsewhere)."""
+    return sum(_sign(x) for x in d[2:6])
+
+VALUE_FUNCTIONS = {'edge': edge_value, 'corner': corner_value, 'diag': diag_value}
+
+def build_tables():
+    """ Precompute the value of every code of every pattern type."""
+    tables = {}
+    for t in PATTERN_TYPES:
+        n = len(PATTERNS[t][0])
+        tables[t] = [VALUE_FUNCTIONS[t](decode(code, n)) for code in xrange(3 ** n)]
+    return tables
+
+def build_swap(n):
+    """ Code with 1 and 2 exchanged in every digit, for every n-digit code."""
+    swap = [0] * 3 ** n
+    for code in xrange(3 ** n):
+        swap[code] = sum((0, 2, 1)[d] * 3 ** i for i, d in enumerate(decode(code, n)))
+    return swap
+
+TABLES = build_tables()
+SWAP = dict((t, build_swap(len(PATTERNS[t][0]))) for t in PATTERN_TYPES)
+
+def set_tables(tables, mobilityWeight=None):
+    """ Replace the pattern tables (e.g. with trained weights)."""
+    global MOBILITY_WEIGHT
+    for t in PATTERN_TYPES:
+        assert len(tables[t]) == len(TABLES[t]), "Wrong table size for %s" % t
+        TABLES[t] = list(tables[t])
+    if mobilityWeight is not None:
+        MOBILITY_WEIGHT = mobilityWeight
+
+def load_tables(fname=WEIGHTS_FILE):
+    """ Load tables written by train.py: {"edge": [..], "corner": [..], "diag": [..], "mobility": w}."""
+    with open(fname) as fin:
+        weights = json.load(fin)
+    set_tables(weights, weights.get('mobility'))
+
+if os.path.exists(WEIGHTS_FILE):
+    load_tables(WEIGHTS_FILE)
+
+# (type, extractor, ternary table) of every instance, in a fixed order
+_PLAN = [(t, ex, tern) for t in PATTERN_TYPES for ex, tern in zip(EXTRACTORS[t], TERNARY[t])]
+
+def pattern_codes(own, opp):
+    """ (type, code) of every pattern instance, with own discs as digit 1."""
+    return [(t, tern[ex(own)] + 2 * tern[ex(opp)]) for t, ex, tern in _PLAN]
+
+def evaluate(own, opp, mobility=True):
+    """ Pattern evaluation of a position from the point of view of `own`."""
+    value = 0
+    tables = TABLES
+    for t, ex, tern in _PLAN:
+        value += tables[t][tern[ex(own)] + 2 * tern[ex(opp)]]
+    if mobility:
+        pc = bitboard.popcount
+        value += MOBILITY_WEIGHT * (pc(bitboard.get_moves(own, opp)) - pc(bitboard.get_moves(opp, own)))
+    return value
+
+# square -> [(instance number, pattern type, 3**digit)] over the instances
+# in pattern_codes() order
+INSTANCES = [(t, cells) for t in PATTERN_TYPES for cells in PATTERNS[t]]
+SQUARE_PATTERNS = [[] for _ in xrange(64)]
+for _k, (_t, _cells) in enumerate(INSTANCES):
+    for _i, _sq in enumerate(_cells):
+        SQUARE_PATTERNS[_sq].append((_k, _t, 3 ** _i))
+
+class PatternState(object):
+    """ Pattern codes of a game position, updated incrementally move by move.
+        Codes are absolute: digit 1 for X, 2 for O.
+
+        Params:
+            xbits, obits: the position to start from.
+    """
+
+    def __init__(self, xbits, obits):
+        self.codes = [code for _, code in pattern_codes(xbits, obits)]
+
+    def play(self, symbol, sq, flips):
+        """ Update the codes for `symbol` playing at sq and flipping `flips`."""
+        codes = self.codes
+        digit = 1 if symbol == 'X' else 2
+        for k, _, p in SQUARE_PATTERNS[sq]:
+            codes[k] += digit * p
+        delta = 1 if symbol == 'O' else -1 # a flipped disc's digit goes 2->1 or 1->2
+        while flips:
+            low = flips & -flips
+            for k, _, p in SQUARE_PATTERNS[low.bit_length() - 1]:
+                codes[k] += delta * p
+            flips ^= low
+
+    def undo(self, symbol, sq, flips):
+        """ Reverse play(symbol, sq, flips)."""
+        codes = self.codes
+        digit = 1 if symbol == 'X' else 2
+        for k, _, p in SQUARE_PATTERNS[sq]:
+            codes[k] -= digit * p
+        delta = 1 if symbol == 'O' else -1
+        while flips:
+            low = flips & -flips
+            for k, _, p in SQUARE_PATTERNS[low.bit_length() - 1]:
+                codes[k] -= delta * p
+            flips ^= low
+
+    def evaluate(self, symbol):
+        """ Pattern value (without mobility) from the point of view of `symbol`."""
+        value = 0
+        if symbol == 'X':
+            for (t, _), code in zip(INSTANCES, self.codes):
+                value += TABLES[t][code]
+        else:
+            for (t, _), code in zip(INSTANCES, self.codes):
+                value += TABLES[t][SWAP[t][code]]
+        return value
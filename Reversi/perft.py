@@ -0,0 +1,146 @@
+#!/usr/bin/python
+
+""" Perft: count the leaf nodes of the game tree to a fixed depth.
+    Validates and benchmarks move generators against known counts.
+    A pass counts as a ply; a finished game (neither side can move) is a leaf.
+    Author: Duong Nguyen
+
+    Usage:
+        python perft.py -d 8
+        python perft.py -d 6 -r lists -w 4
+        python perft.py -d 5 -p "---------------------------XO------OX--------------------------- X"
+"""
+
+import argparse
+import multiprocessing
+import time
+
+import ai_sim2
+import bitboard
+import othello
+
+# CONSTANTS
+# known leaf counts from the initial position, index = depth
+PERFT_COUNTS = [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284]
+
+# representation name -> (engine module, function (xbits, obits) -> board)
+REPRESENTATIONS = {
+    'lists': (othello, lambda x, o: bitboard.to_rows(x, o)),
+    'bitboard': (ai_sim2, lambda x, o: [x, o, bitboard.popcount(x), bitboard.popcount(o)]),
+}
+
+def other(symbol):
+    return 'O' if symbol == 'X' else 'X'
+
+def perft(m, board, symbol, depth, passed=False):
+    """ Number of leaf nodes `depth` plies below a position.
+
+        Params:
+            m: engine module (get_valid_moves, make_move, unmake_move).
+            board: position in the module's representation; restored on return.
+            symbol: the player to move.
+            depth: plies to search.
+            passed: the previous ply was a pass.
+    """
+    if depth == 0:
+        return 1
+    moves = m.get_valid_moves(board, symbol)
+    if not moves:
+        if passed: # neither player can move: the game is over
+            return 1
+        return perft(m, board, other(symbol), depth - 1, True)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    opponent = other(symbol)
+    for r, c in moves:
+        flips = m.make_move(board, symbol, r, c)
+        nodes += perft(m, board, opponent, depth - 1)
+        m.unmake_move(board, symbol, r, c, flips)
+    return nodes
+
+def parse_position(text):
+    """ Parse '<64 cells> <side to move>', cells row by row as X, O or -/. for empty.
+
+        Returns:
+            (xbits, obits, symbol)
+    """
+    cells, symbol = text.split()
+    symbol = symbol.upper()
+    if len(cells) != 64 or symbol not in ('X', 'O'):
+        raise ValueError('Expected 64 cells and X or O to move, got %r' % text)
+    xbits = obits = 0
+    for sq, cell in enumerate(cells.upper()):
+        if cell == 'X':
+            xbits |= 1 << sq
+        elif cell == 'O':
+            obits |= 1 << sq
+        elif cell not in '-.':
+            raise ValueError('Bad cell %r in %r' % (cell, text))
+    return xbits, obits, symbol
+
+def _root_move_perft(task):
+    """ Worker: perft below one root move. move None means the root player passes."""
+    name, xbits, obits, symbol, move, depth = task
+    m, toBoard = REPRESENTATIONS[name]
+    board = toBoard(xbits, obits)
+    if move is None:
+        return perft(m, board, other(symbol), depth - 1, True)
+    m.make_move(board, symbol, move[0], move[1])
+    return perft(m, board, other(symbol), depth - 1)
+
+def divide(name, xbits, obits, symbol, depth, workers=1):
+    """ Perft split by root move, optionally across worker processes.
+
+        Returns:
+            A list of (move, nodes); move is None for a root pass.
+    """
+    m, toBoard = REPRESENTATIONS[name]
+    moves = m.get_valid_moves(toBoard(xbits, obits), symbol)
+    if depth == 0 or (not moves and not m.get_valid_moves(toBoard(xbits, obits), other(symbol))):
+        return [(None, 1)]
+    tasks = [(name, xbits, obits, symbol, move, depth) for move in (moves or [None])]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            counts = pool.map(_root_move_perft, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = map(_root_move_perft, tasks)
+    return zip([t[4] for t in tasks], counts)
+
+def main():
+    parser = argparse.ArgumentParser(description='Count Reversi game-tree leaves to a fixed depth.')
+    parser.add_argument('-d', '--depth', type=int, default=6, help='perft depth')
+    parser.add_argument('-r', '--repr', default='bitboard', choices=sorted(REPRESENTATIONS),
+                        help='board representation / move generator')
+    parser.add_argument('-p', '--position', default=None,
+                        help='"<64 cells of X/O/-> <X|O>" (default: the initial position, X to move)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='split root moves across processes')
+    parser.add_argument('--divide', action='store_true', help='print the count below every root move')
+    args = parser.parse_args()
+
+    if args.position:
+        xbits, obits, symbol = parse_position(args.position)
+    else:
+        xbits, obits, symbol = bitboard.INIT_X, bitboard.INIT_O, 'X'
+
+    start = time.time()
+    split = divide(args.repr, xbits, obits, symbol, args.depth, args.workers)
+    secs = time.time() - start
+    nodes = sum(n for _, n in split)
+
+    if args.divide:
+        for move, n in split:
+            print '%s: %s' %('pass' if move is None else '%d%d' %(move[0]+1, move[1]+1), n)
+    print 'perft(%d) = %d in %.3f s (%.0f nodes/s)' %(args.depth, nodes, secs, nodes / max(secs, 1e-9))
+    if not args.position and args.depth < len(PERFT_COUNTS):
+        if nodes == PERFT_COUNTS[args.depth]:
+            print 'OK: matches the known count.'
+        else:
+            print 'MISMATCH: expected %d.' % PERFT_COUNTS[args.depth]
+
+if __name__ == '__main__':
+    main()
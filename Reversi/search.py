@@ -0,0 +1,233 @@
+#!/usr/bin/python
+
+""" Game-tree search for Reversi (Othello) on bitboards.
+    Negamax with alpha-beta pruning and iterative deepening under a time budget.
+    Optionally the transposition table is keyed on the canonical form of
+    positions (symmetry.py), so symmetric positions share their entries.
+    Author: Duong Nguyen
+"""
+
+import time
+
+import bitboard
+import symmetry
+import transposition
+from transposition import EXACT, LOWER, UPPER
+
+# CONSTANTS
+INF = 1 << 30
+WIN_SCORE = 1 << 20 # added to the final disc difference of a finished game
+CORNER_WEIGHT = 25
+XSQUARE_WEIGHT = -12 # diagonal neighbours of the corners
+MOBILITY_WEIGHT = 3
+CHECK_EVERY = 64 # nodes between two clock checks
+ITERATION_GROWTH = 3 # an iteration usually costs about this many times the previous one
+SYMMETRY_MIN_DEPTH = 1 # canonical table keys at nodes this far from the leaves (higher
+                       # loses the move ordering one iteration leaves for the next)
+
+XSQUARES = (1 << 9) | (1 << 14) | (1 << 49) | (1 << 54)
+ORDER_FIRST = bitboard.CORNERS
+ORDER_LAST = XSQUARES
+
+class SearchTimeout(Exception):
+    """ Raised inside the search when the time budget is used up."""
+    pass
+
+def evaluate(own, opp):
+    """ Static evaluation of a position from the point of view of `own`.
+        Disc difference plus corner, X-square and mobility terms.
+    """
+    pc = bitboard.popcount
+    score = pc(own) - pc(opp)
+    score += CORNER_WEIGHT * (pc(own & bitboard.CORNERS) - pc(opp & bitboard.CORNERS))
+    score += XSQUARE_WEIGHT * (pc(own & XSQUARES) - pc(opp & XSQUARES))
+    score += MOBILITY_WEIGHT * (pc(bitboard.get_moves(own, opp)) - pc(bitboard.get_moves(opp, own)))
+    return score
+
+def final_score(own, opp):
+    """ Score of a finished game from the point of view of `own`."""
+    diff = bitboard.popcount(own) - bitboard.popcount(opp)
+    if diff > 0:
+        return WIN_SCORE + diff
+    if diff < 0:
+        return -WIN_SCORE + diff
+    return 0
+
+def order_moves(moves, first=None):
+    """ List the squares of the move mask `moves`, most promising first.
+        Order: `first` (e.g. best move of the previous iteration), corners,
+        ordinary squares, X-squares.
+    """
+    ordered = []
+    if first is not None and moves & (1 << first):
+        ordered.append(first)
+        moves &= ~(1 << first)
+    for part in (moves & ORDER_FIRST, moves & ~(ORDER_FIRST | ORDER_LAST), moves & ORDER_LAST):
+        ordered.extend(bitboard.iter_squares(part))
+    return ordered
+
+class Searcher(object):
+    """ Negamax alpha-beta searcher with iterative deepening.
+
+        Params:
+            maxDepth: deepest iteration to run.
+            timeLimit: seconds allowed per call to search(). None for no limit.
+                       No iteration is started that is not expected to finish
+                       in time; a running one is abandoned at the deadline.
+            evaluate: static evaluation function (own, opp) -> score.
+            table: a transposition.TranspositionTable shared across searches,
+                   or None to search without one.
+            symmetric: key the table on canonical positions at nodes at least
+                       SYMMETRY_MIN_DEPTH from the leaves, so the 8 symmetric
+                       versions of a position share an entry. Exact with a
+                       symmetric evaluation such as evaluate() here.
+    """
+
+    def __init__(self, maxDepth=64, timeLimit=None, evaluate=evaluate, table=None, symmetric=False):
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit
+        self.evaluate = evaluate
+        self.table = table
+        self.symmetric = symmetric
+        self.nodes = 0
+        self.depth = 0
+        self.secs = 0.
+        self.deadline = None
+
+    def search(self, own, opp):
+        """ Find the best move for the player owning `own`.
+
+            Returns:
+                (square, score) of the deepest completed iteration.
+                (None, score) if the player has no legal move.
+        """
+        self.nodes = 0
+        self.depth = 0
+        start = time.time()
+        if self.timeLimit is None:
+            self.deadline = None
+        else:
+            self.deadline = start + self.timeLimit
+
+        moves = bitboard.get_moves(own, opp)
+        if not moves:
+            self.secs = time.time() - start
+            return None, self.evaluate(own, opp)
+        key, swapped = transposition.hash_position(own, opp)
+        first = None
+        if self.table is not None:
+            tableKey, t = self._table_key(own, opp, key, SYMMETRY_MIN_DEPTH)
+            entry = self.table.probe(tableKey)
+            if entry is not None and entry[3] is not None:
+                first = symmetry.SQUARE_MAP[symmetry.INVERSE[t]][entry[3]]
+        bestMove = order_moves(moves, first)[0]
+        bestScore = -INF
+        if not moves & (moves - 1): # a single legal move: nothing to think about
+            self.secs = time.time() - start
+            return bestMove, bestScore
+
+        for depth in xrange(1, self.maxDepth + 1):
+            iterStart = time.time()
+            try:
+                move, score = self._root(own, opp, key, swapped, moves, depth, bestMove)
+            except SearchTimeout:
+                break
+            bestMove, bestScore = move, score
+            self.depth = depth
+            if abs(score) >= WIN_SCORE: # game result is proven
+                break
+            if bitboard.popcount(~(own | opp) & bitboard.FULL) <= depth: # searched to the end
+                break
+            now = time.time()
+            if self.deadline is not None and now + (now - iterStart) * ITERATION_GROWTH > self.deadline:
+                break # the next iteration would not finish in time
+        self.secs = time.time() - start
+        return bestMove, bestScore
+
+    def _table_key(self, own, opp, key, depth):
+        """ Table key of a position searched to `depth`, and the transform its
+            stored move is expressed in (0: the position's own squares).
+        """
+        if self.symmetric and depth >= SYMMETRY_MIN_DEPTH:
+            return symmetry.canonical_key(own, opp)
+        return key, 0
+
+    def _root(self, own, opp, key, swapped, moves, depth, first):
+        """ One iteration at the root. The previous best move is searched first."""
+        alpha, beta = -INF, INF
+        bestMove = first
+        for sq in order_moves(moves, first):
+            flips = bitboard.get_flips(own, opp, sq)
+            ckey, cswapped = transposition.play_hash(key, swapped, sq, flips)
+            score = -self._negamax(opp ^ flips, own | flips | (1 << sq), ckey, cswapped,
+                                   depth - 1, -beta, -alpha)
+            if score > alpha:
+                alpha = score
+                bestMove = sq
+        if self.table is not None:
+            tableKey, t = self._table_key(own, opp, key, SYMMETRY_MIN_DEPTH)
+            self.table.store(tableKey, depth, EXACT, alpha, symmetry.SQUARE_MAP[t][bestMove])
+        return bestMove, alpha
+
+    def _negamax(self, own, opp, key, swapped, depth, alpha, beta):
+        """ Alpha-beta negamax value of a position for the player owning `own`.
+            key, swapped: Zobrist keys of (own, opp) and (opp, own).
+        """
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % CHECK_EVERY == 0 and time.time() > self.deadline:
+            raise SearchTimeout()
+
+        moves = bitboard.get_moves(own, opp)
+        if not moves:
+            if not bitboard.get_moves(opp, own): # nobody can move: game over
+                return final_score(own, opp)
+            return -self._negamax(opp, own, swapped, key, depth, -beta, -alpha) # pass
+        if depth <= 0:
+            return self.evaluate(own, opp)
+
+        table = self.table
+        ttMove = None
+        if table is not None:
+            tableKey, t = self._table_key(own, opp, key, depth)
+            entry = table.probe(tableKey)
+            if entry is not None:
+                ttDepth, flag, score, ttMove = entry
+                if t and ttMove is not None:
+                    ttMove = symmetry.SQUARE_MAP[symmetry.INVERSE[t]][ttMove]
+                if ttDepth >= depth:
+                    if flag == EXACT:
+                        return score
+                    if flag == LOWER and score > alpha:
+                        alpha = score
+                    elif flag == UPPER and score < beta:
+                        beta = score
+                    if alpha >= beta:
+                        return score
+
+        alphaOrig = alpha
+        bestScore = -INF
+        bestMove = None
+        for sq in order_moves(moves, ttMove):
+            flips = bitboard.get_flips(own, opp, sq)
+            ckey, cswapped = transposition.play_hash(key, swapped, sq, flips)
+            score = -self._negamax(opp ^ flips, own | flips | (1 << sq), ckey, cswapped,
+                                   depth - 1, -beta, -alpha)
+            if score > bestScore:
+                bestScore = score
+                bestMove = sq
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if table is not None:
+            if bestScore <= alphaOrig:
+                flag = UPPER
+            elif bestScore >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            if t:
+                bestMove = symmetry.SQUARE_MAP[t][bestMove]
+            table.store(tableKey, depth, flag, bestScore, bestMove)
+        return bestScore
@@ -0,0 +1,317 @@
+#!/usr/bin/python
+
+""" Reversi game server: many concurrent human-vs-computer sessions.
+    One event loop (asyncore/asynchat, poll based, so thousands of sockets
+    are fine) keeps the state of every session; computer moves are computed
+    by othello.get_computer_move in a process pool, so a slow search never
+    holds up the other sessions. Results come back to the loop through a
+    queue and a wakeup socket.
+    Author: Duong Nguyen
+
+    Line protocol (one connection = one session, moves are "r,c" from 1):
+        NEW [X|O] [secs]   start a game as X (default) or O; secs is the
+                           computer's time per game (default GAME_TIME)
+        MOVE r,c           play a move
+        BOARD              show the position
+        STATS              server metrics
+        QUIT               close the session
+    Replies:
+        BOARD <64 cells of X/O/-> <X|O>    position, side to move (your turn)
+        MOVE r,c                           the computer's move
+        PASS X|O                           a player had to pass
+        END <X discs> <O discs>            game over
+        STATS key=value ...
+        ERR <reason>, BYE
+
+    Usage: python server.py -p 7777 -w 4
+"""
+
+import argparse
+import asynchat
+import asyncore
+import collections
+import multiprocessing
+import Queue
+import random
+import socket
+import sys
+import time
+
+import bitboard
+import clock
+import othello
+
+# CONSTANTS
+GAME_TIME = 30. # computer's seconds per game, unless NEW says otherwise
+MOVE_TIME = 2. # computer's cap per move
+LATENCY_WINDOW = 1000 # computer moves kept for the latency percentiles
+REPORT_EVERY = 10. # seconds between two metrics lines on stderr (0: never)
+
+def compute_move(task):
+    """ Worker: the computer's move in a position, before `deadline`.
+
+        Params:
+            task: (session id, xbits, obits, symbol, deadline (time.time() value), seed)
+
+        Returns:
+            (session id, [r, c], clock log entry) or (session id, None, error message).
+    """
+    sid, xbits, obits, symbol, deadline, seed = task
+    try:
+        gameClock = clock.GameClock(moveTime=max(clock.MIN_MOVE_TIME, deadline - time.time()))
+        move = othello.get_computer_move(bitboard.to_rows(xbits, obits), symbol,
+                                         random.Random(seed), gameClock)
+        return sid, move, gameClock.log[-1]
+    except Exception as e: # the loop must hear back about every task
+        return sid, None, '%s: %s' % (type(e).__name__, e)
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.
+    return values[min(len(values) - 1, int(round(q / 100. * (len(values) - 1))))]
+
+class Session(asynchat.async_chat):
+    """ One client connection and its game."""
+
+    def __init__(self, sock, server, sid):
+        asynchat.async_chat.__init__(self, sock)
+        self.set_terminator('\n')
+        self.server = server
+        self.sid = sid
+        self.buffer = []
+        self.xbits = self.obits = 0
+        self.human = self.computer = None
+        self.turn = None
+        self.clock = None
+        self.thinking = False # a computer move is being computed
+
+    def collect_incoming_data(self, data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer).strip()
+        self.buffer = []
+        if line:
+            self.handle_command(line.split())
+
+    def send_line(self, line):
+        self.push(line + '\n')
+
+    def handle_command(self, words):
+        cmd = words[0].upper()
+        if cmd == 'QUIT':
+            self.send_line('BYE')
+            self.close_when_done()
+        elif cmd == 'STATS':
+            self.send_line('STATS ' + ' '.join('%s=%s' % kv for kv in self.server.metrics()))
+        elif cmd == 'BOARD':
+            self.send_board()
+        elif self.thinking:
+            self.send_line('ERR the computer is thinking')
+        elif cmd == 'NEW':
+            self.new_game(words[1:])
+        elif cmd == 'MOVE':
+            self.human_move(words[1:])
+        else:
+            self.send_line('ERR unknown command %s' % cmd)
+
+    def new_game(self, args):
+        human = args[0].upper() if args else 'X'
+        if human not in ('X', 'O'):
+            return self.send_line('ERR choose X or O')
+        try:
+            gameTime = float(args[1]) if len(args) > 1 else GAME_TIME
+        except ValueError:
+            return self.send_line('ERR bad time %s' % args[1])
+        self.human, self.computer = human, 'O' if human == 'X' else 'X'
+        self.xbits, self.obits = bitboard.INIT_X, bitboard.INIT_O
+        self.turn = 'X'
+        self.clock = clock.GameClock(gameTime, MOVE_TIME)
+        self.server.gamesStarted += 1
+        self.advance()
+
+    def human_move(self, args):
+        if self.turn is None or self.turn != self.human:
+            return self.send_line('ERR no game in progress, send NEW')
+        try:
+            r, c = [int(x) - 1 for x in ''.join(args).split(',')]
+            sq = bitboard.square(r, c)
+        except ValueError:
+            return self.send_line('ERR expected MOVE r,c')
+        if not (0 <= r < bitboard.SIZE and 0 <= c < bitboard.SIZE) or not self.play(sq):
+            return self.send_line('ERR illegal move %d,%d' % (r + 1, c + 1))
+        self.advance()
+
+    def own_opp(self):
+        return (self.xbits, self.obits) if self.turn == 'X' else (self.obits, self.xbits)
+
+    def play(self, sq):
+        """ Play sq for the side to move; False if illegal."""
+        own, opp = self.own_opp()
+        flips = bitboard.get_flips(own, opp, sq)
+        if not flips:
+            return False
+        own, opp = own | flips | (1 << sq), opp ^ flips
+        self.xbits, self.obits = (own, opp) if self.turn == 'X' else (opp, own)
+        self.turn = 'O' if self.turn == 'X' else 'X'
+        return True
+
+    def advance(self):
+        """ Handle passes and the end of the game, then wait for whoever is to move."""
+        own, opp = self.own_opp()
+        if not bitboard.get_moves(own, opp):
+            if not bitboard.get_moves(opp, own):
+                self.send_line('END %d %d' % (bitboard.popcount(self.xbits), bitboard.popcount(self.obits)))
+                self.turn = None
+                self.server.gamesFinished += 1
+                return
+            self.send_line('PASS %s' % self.turn)
+            self.turn = 'O' if self.turn == 'X' else 'X'
+        if self.turn == self.computer:
+            self.thinking = True
+            self.clock.start(bitboard.popcount(~(self.xbits | self.obits) & bitboard.FULL))
+            self.server.submit(self, self.clock.deadline)
+        else:
+            self.send_board()
+
+    def computer_moved(self, move, info):
+        """ Called by the server loop with the worker's answer."""
+        self.thinking = False
+        if move is None:
+            self.send_line('ERR computer failed: %s' % info)
+            self.turn = None
+            return
+        self.clock.stop(move, info['source'], info['nodes'], info['depth'])
+        self.play(bitboard.square(*move))
+        self.send_line('MOVE %d,%d' % (move[0] + 1, move[1] + 1))
+        self.advance()
+
+    def send_board(self):
+        if self.turn is None:
+            return self.send_line('ERR no game in progress, send NEW')
+        cells = ''.join('X' if self.xbits >> sq & 1 else 'O' if self.obits >> sq & 1 else '-'
+                        for sq in xrange(64))
+        self.send_line('BOARD %s %s' % (cells, self.turn))
+
+    def handle_close(self):
+        self.server.sessions.pop(self.sid, None)
+        self.close()
+
+class Wakeup(asyncore.dispatcher):
+    """ Read end of a socket pair: a byte arrives whenever a result is queued."""
+
+    def __init__(self, sock, server):
+        asyncore.dispatcher.__init__(self, sock)
+        self.server = server
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        self.server.deliver()
+
+class GameServer(asyncore.dispatcher):
+    """ Listening socket, session table, process pool and metrics.
+
+        Params:
+            host, port: address to listen on.
+            workers: processes computing computer moves. Default: number of CPUs.
+    """
+
+    def __init__(self, host='127.0.0.1', port=7777, workers=None):
+        self.pool = multiprocessing.Pool(workers) # before any socket, so workers inherit none
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(1024)
+        self.address = self.socket.getsockname()
+        self.results = Queue.Queue()
+        self.wakeRead, self.wakeWrite = socket.socketpair()
+        self.wakeup = Wakeup(self.wakeRead, self)
+        self.sessions = {}
+        self.nextSid = 0
+        self.started = time.time()
+        self.gamesStarted = self.gamesFinished = 0
+        self.submitted = self.completed = 0
+        self.latency = collections.deque(maxlen=LATENCY_WINDOW) # seconds per computer move
+        self.sentAt = {}
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return
+        sock, _ = pair
+        self.nextSid += 1
+        self.sessions[self.nextSid] = Session(sock, self, self.nextSid)
+
+    def submit(self, session, deadline):
+        """ Queue the computer's move of a session on the pool."""
+        self.submitted += 1
+        self.sentAt[session.sid] = time.time()
+        task = (session.sid, session.xbits, session.obits, session.computer, deadline,
+                random.getrandbits(32))
+        self.pool.apply_async(compute_move, (task,), callback=self._on_result)
+
+    def _on_result(self, result):
+        """ Pool thread: hand the result over to the event loop."""
+        self.results.put(result)
+        self.wakeWrite.send('x')
+
+    def deliver(self):
+        """ Event loop: pass finished computer moves on to their sessions."""
+        while True:
+            try:
+                sid, move, info = self.results.get_nowait()
+            except Queue.Empty:
+                return
+            self.completed += 1
+            self.latency.append(time.time() - self.sentAt.pop(sid))
+            session = self.sessions.get(sid)
+            if session is not None: # the client may have gone away
+                session.computer_moved(move, info)
+
+    def metrics(self):
+        """ [(name, value)] of the server counters."""
+        secs = time.time() - self.started
+        return [('sessions', len(self.sessions)),
+                ('games_started', self.gamesStarted),
+                ('games_finished', self.gamesFinished),
+                ('moves', self.completed),
+                ('moves_per_sec', '%.1f' % (self.completed / secs if secs else 0.)),
+                ('queue_depth', self.submitted - self.completed),
+                ('latency_p50', '%.3f' % percentile(self.latency, 50)),
+                ('latency_p99', '%.3f' % percentile(self.latency, 99)),
+                ('uptime', '%.0f' % secs)]
+
+    def serve_forever(self, reportEvery=REPORT_EVERY):
+        lastReport = time.time()
+        try:
+            while True:
+                asyncore.loop(timeout=1., use_poll=True, count=1)
+                if reportEvery and time.time() - lastReport >= reportEvery:
+                    lastReport = time.time()
+                    sys.stderr.write(' '.join('%s=%s' % kv for kv in self.metrics()) + '\n')
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Reversi games over a line protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=7777)
+    parser.add_argument('-w', '--workers', type=int, default=None, help='AI processes (default: all CPUs)')
+    parser.add_argument('-r', '--report', type=float, default=REPORT_EVERY, help='seconds between metrics lines, 0 for none')
+    args = parser.parse_args()
+
+    server = GameServer(args.host, args.port, args.workers)
+    sys.stderr.write('Serving Reversi on %s:%d\n' % server.address)
+    try:
+        server.serve_forever(args.report)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+""" The 8 symmetries of the Reversi board (rotations and reflections) on
+    bitboards, and a canonical form for positions: the smallest (own, opp)
+    over the 8 images. Positions that are the same up to symmetry share one
+    canonical form, so caches and books keyed on it hold each of them once.
+    Transforms are branch-free bit swaps; the square maps are precomputed.
+    Author: Duong Nguyen
+"""
+
+import bitboard
+
+# CONSTANTS
+FULL = bitboard.FULL
+
+def mirror_rows(b):
+    """ Reflect top <-> bottom: row r goes to row 7-r (a byte swap)."""
+    b = ((b >> 8) & 0x00FF00FF00FF00FF) | ((b & 0x00FF00FF00FF00FF) << 8)
+    b = ((b >> 16) & 0x0000FFFF0000FFFF) | ((b & 0x0000FFFF0000FFFF) << 16)
+    return (b >> 32) | ((b << 32) & FULL)
+
+def mirror_cols(b):
+    """ Reflect left <-> right: column c goes to column 7-c."""
+    b = ((b >> 1) & 0x5555555555555555) | ((b & 0x5555555555555555) << 1)
+    b = ((b >> 2) & 0x3333333333333333) | ((b & 0x3333333333333333) << 2)
+    return ((b >> 4) & 0x0F0F0F0F0F0F0F0F) | ((b & 0x0F0F0F0F0F0F0F0F) << 4)
+
+def transpose(b):
+    """ Reflect in the main diagonal: (r, c) goes to (c, r)."""
+    t = 0x0F0F0F0F00000000 & (b ^ (b << 28))
+    b ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (b ^ (b << 14))
+    b ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (b ^ (b << 7))
+    b ^= t ^ (t >> 7)
+    return b
+
+def _compose(*fs):
+    def transform(b):
+        for f in fs:
+            b = f(b)
+        return b
+    return transform
+
+# the 8 symmetries; transform i maps a board to its i-th image
+TRANSFORMS = [lambda b: b, mirror_cols, mirror_rows, _compose(mirror_cols, mirror_rows),
+              transpose, _compose(mirror_cols, transpose), _compose(mirror_rows, transpose),
+              _compose(mirror_cols, mirror_rows, transpose)]
+
+# SQUARE_MAP[i][sq]: where transform i sends square sq; INVERSE[i]: the transform undoing i
+SQUARE_MAP = [[(f(1 << sq)).bit_length() - 1 for sq in xrange(64)] for f in TRANSFORMS]
+INVERSE = [SQUARE_MAP.index(sorted(range(64), key=m.__getitem__)) for m in SQUARE_MAP]
+
+def images(b):
+    """ The 8 images of a bitboard, in TRANSFORMS order, sharing intermediate steps."""
+    c = mirror_cols(b)
+    r = mirror_rows(b)
+    cr = mirror_rows(c)
+    return [b, c, r, cr, transpose(b), transpose(c), transpose(r), transpose(cr)]
+
+def canonical(own, opp):
+    """ Canonical form of a position.
+
+        Returns:
+            (own', opp', i): the smallest image and the transform i producing it.
+            A square sq of the position is square SQUARE_MAP[i][sq] of the
+            canonical one, and back with SQUARE_MAP[INVERSE[i]].
+    """
+    best = (own, opp, 0)
+    i = 0
+    for o, p in zip(images(own), images(opp)):
+        if o < best[0] or (o == best[0] and p < best[1]):
+            best = (o, p, i)
+        i += 1
+    return best
+
+def canonical_key(own, opp):
+    """ 64-bit hash key of the canonical form of a position, for hash tables.
+
+        Returns:
+            (key, i): i is the transform to the canonical form, as in canonical().
+    """
+    own, opp, i = canonical(own, opp)
+    h = ((own * 0x9E3779B97F4A7C15) ^ (opp * 0xC2B2AE3D27D4EB4F)) & FULL
+    return h ^ (h >> 32), i # fold the well-mixed top bits into the low ones
+
+def stabilizer(own, opp):
+    """ Transforms mapping a position onto itself (always including 0, the identity).
+        In such a position moves related by these transforms are equivalent.
+    """
+    return [i for i, (o, p) in enumerate(zip(images(own), images(opp))) if o == own and p == opp]
+
+def canonical_rows(board):
+    """ Canonical form of a list-of-lists 8x8 board (e.g. from get_board_copy),
+        with X as own: (xbits', obits', i), see canonical().
+    """
+    xbits, obits = bitboard.from_rows(board)
+    return canonical(xbits, obits)
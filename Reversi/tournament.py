@@ -0,0 +1,59 @@
+#!/usr/bin/python
+
+""" Round-robin tournament between Reversi AI strategies.
+    Games are split into chunks and played across a process pool by engine.py;
+    results are identical for any pool size and chunk size.
+    Author: Duong Nguyen
+
+    Usage: python tournament.py -n 1000 -w 4 corner side search
+"""
+
+import argparse
+import itertools
+import time
+
+import engine
+
+STRATEGIES = engine.STRATEGIES
+
+def run_tournament(names, nGames, workers=None, seed=0, chunkSize=engine.CHUNK_SIZE):
+    """ Play every pair of strategies against each other nGames times.
+
+        Params:
+            names: list of strategy names (registered in engine.STRATEGIES).
+            nGames: number of games per pairing.
+            workers: size of the process pool. Default: number of CPUs.
+                     1 plays everything in this process.
+            seed: base seed; game k of a pairing plays with game_rng(seed, nameA, nameB, k).
+
+        Returns:
+            {(nameA, nameB): {'wins': .., 'losses': .., 'ties': .., 'diffs': [..], ...}}
+            counted from nameA's point of view, see engine.match_stats.
+    """
+    return engine.play_matches(list(itertools.combinations(names, 2)), nGames, workers, seed, chunkSize)
+
+def show_results(table):
+    """ Print one line per pairing."""
+    for (nameA, nameB), pair in sorted(table.items()):
+        n = len(pair['diffs'])
+        print '%s vs %s: %s-%s-%s (W-L-T of %s games, %.1f%% wins), mean disc diff %+.2f' \
+                %(nameA, nameB, pair['wins'], pair['losses'], pair['ties'], n,
+                  pair['wins']*100./n, sum(pair['diffs'])*1./n)
+
+def main():
+    parser = argparse.ArgumentParser(description='Round-robin tournament between Reversi strategies.')
+    parser.add_argument('strategies', nargs='+', help='strategy names: %s' % ', '.join(sorted(STRATEGIES)))
+    parser.add_argument('-n', '--games', type=int, default=100, help='games per pairing')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all CPUs)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='base random seed')
+    args = parser.parse_args()
+
+    start = time.time()
+    table = run_tournament(args.strategies, args.games, args.workers, args.seed)
+    secs = time.time() - start
+    show_results(table)
+    nGames = sum(len(pair['diffs']) for pair in table.values())
+    print '%s games in %.2f s (%.1f games/s)' %(nGames, secs, nGames / secs)
+
+if __name__ == '__main__':
+    main()
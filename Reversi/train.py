@@ -0,0 +1,204 @@
+#!/usr/bin/python
+
+""" Train the pattern evaluation (patterns.py) from self-play.
+    1. generate: play games between the ai_sim2 strategies across a process
+       pool and append every position with its final result to a binary
+       dataset (fixed-size records, see RECORD).
+    2. fit: stream the dataset through a memory map in NumPy batches and fit
+       the pattern tables and the mobility weight by SGD on the squared error
+       of the predicted final disc difference. The dataset never has to fit
+       in RAM.
+    Author: Duong Nguyen
+
+    Usage:
+        python train.py generate -n 20000 -o selfplay.bin corner side pattern
+        python train.py fit -d selfplay.bin -e 5 -o patterns.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+import ai_sim2 as sim
+import batch_sim
+import bitboard
+import engine
+import patterns
+
+# CONSTANTS
+# one position: discs of the player to move, of the opponent, the final disc
+# difference for the player to move, and the number of empty squares
+RECORD = np.dtype([('own', '<u8'), ('opp', '<u8'), ('result', 'i1'), ('empties', 'u1')])
+EPSILON = 0.1 # probability of a random move, so games do not repeat
+GAMES_PER_TASK = 50
+# the mobility weight sees every position while a table entry sees few,
+# so it gets a smaller step
+MOBILITY_LR_SCALE = 0.01
+POW3 = dict((t, 3 ** np.arange(len(patterns.PATTERNS[t][0]), dtype=np.int64)) for t in patterns.PATTERN_TYPES)
+SQUARES = np.arange(64, dtype=np.uint64)
+
+def play_positions(task):
+    """ Worker: play games and return their positions as a RECORD array.
+
+        Params:
+            task: (strategy names, first game number, number of games, base seed)
+    """
+    names, start, nGames, seed = task
+    records = []
+    for game in xrange(start, start + nGames):
+        rng = sim.game_rng(seed, game)
+        moveFor = {'X': engine.STRATEGIES[rng.choice(names)],
+                   'O': engine.STRATEGIES[rng.choice(names)]}
+        board = sim.get_blank_board(nr=sim.NROWS, nc=sim.NCOLS)
+        sim.init_board(board)
+        turn = rng.choice('XO')
+        history = [] # (own, opp, symbol, empties)
+        passed = False
+        while True:
+            opponent = 'O' if turn == 'X' else 'X'
+            moves = sim.get_valid_moves(board, turn)
+            if moves:
+                i = sim.BB_INDEX[turn]
+                history.append((board[i], board[1-i], turn, 64 - board[2] - board[3]))
+                if rng.random() < EPSILON:
+                    r, c = rng.choice(moves)
+                else:
+                    r, c = moveFor[turn](board, turn, rng)
+                sim.make_move(board, turn, r, c)
+                passed = False
+            elif passed:
+                break
+            else:
+                passed = True
+            turn = opponent
+        diff = board[2] - board[3] # X - O
+        for own, opp, symbol, empties in history:
+            records.append((own, opp, diff if symbol == 'X' else -diff, empties))
+    return np.array(records, dtype=RECORD)
+
+def generate(fname, names, nGames, workers=None, seed=0):
+    """ Append the positions of nGames self-play games to fname. Returns the number of records."""
+    tasks = [(names, start, min(GAMES_PER_TASK, nGames - start), seed)
+             for start in xrange(0, nGames, GAMES_PER_TASK)]
+    total = 0
+    pool = multiprocessing.Pool(workers)
+    try:
+        with open(fname, 'ab') as fout:
+            for chunk in pool.imap(play_positions, tasks): # in order: same file for any pool size
+                chunk.tofile(fout)
+                total += len(chunk)
+    finally:
+        pool.close()
+        pool.join()
+    return total
+
+def load_dataset(fname):
+    """ Memory-mapped, read-only view of a dataset file."""
+    return np.memmap(fname, dtype=RECORD, mode='r')
+
+def features(batch):
+    """ Pattern codes and mobility difference of a batch of records.
+
+        Returns:
+            ({type: int array (n, instances)}, float array (n,))
+    """
+    own = np.ascontiguousarray(batch['own'])
+    opp = np.ascontiguousarray(batch['opp'])
+    one = np.uint64(1)
+    digits = (((own[:, None] >> SQUARES) & one).astype(np.int64) +
+              2 * ((opp[:, None] >> SQUARES) & one).astype(np.int64))
+    codes = {}
+    for t in patterns.PATTERN_TYPES:
+        codes[t] = np.stack([digits[:, cells].dot(POW3[t]) for cells in patterns.PATTERNS[t]], axis=1)
+    mobility = (batch_sim.popcount(batch_sim.get_moves(own, opp)) -
+                batch_sim.popcount(batch_sim.get_moves(opp, own))).astype(np.float64)
+    return codes, mobility
+
+def predict(weights, codes, mobility):
+    """ Model output for a batch: sum of table entries plus the mobility term."""
+    pred = weights['mobility'] * mobility
+    for t in patterns.PATTERN_TYPES:
+        pred = pred + weights[t][codes[t]].sum(axis=1)
+    return pred
+
+def fit(fname, epochs=5, batchSize=4096, lr=0.05, minEmpties=0, seed=0):
+    """ Fit the pattern tables by minibatch SGD, streaming the dataset.
+
+        Params:
+            minEmpties: skip positions with fewer empty squares (the endgame
+                        solver handles those).
+
+        Returns:
+            {type: float array, 'mobility': float}
+    """
+    data = load_dataset(fname)
+    weights = dict((t, np.zeros(3 ** len(patterns.PATTERNS[t][0]))) for t in patterns.PATTERN_TYPES)
+    weights['mobility'] = 0.
+    rng = np.random.RandomState(seed)
+    starts = np.arange(0, len(data), batchSize)
+    for epoch in xrange(epochs):
+        rng.shuffle(starts) # shuffle whole batches: reads stay sequential
+        sse = n = 0.
+        for start in starts:
+            batch = data[start:start + batchSize]
+            batch = batch[batch['empties'] >= minEmpties]
+            if not len(batch):
+                continue
+            codes, mobility = features(batch)
+            target = batch['result'].astype(np.float64)
+            err = predict(weights, codes, mobility) - target
+            sse += (err ** 2).sum()
+            n += len(err)
+            # gradient of the mean squared error, summed per table entry
+            scale = lr / len(err)
+            for t in patterns.PATTERN_TYPES:
+                size = len(weights[t])
+                grad = sum(np.bincount(codes[t][:, k], weights=err, minlength=size)
+                           for k in xrange(codes[t].shape[1]))
+                weights[t] -= scale * grad
+            weights['mobility'] -= scale * MOBILITY_LR_SCALE * (err * mobility).sum()
+        print 'epoch %d: rmse %.3f over %d positions' %(epoch + 1, (sse / max(n, 1)) ** 0.5, n)
+    return weights
+
+def save_weights(fname, weights):
+    """ Write weights in the format patterns.load_tables() reads."""
+    out = dict((t, [round(float(v), 4) for v in weights[t]]) for t in patterns.PATTERN_TYPES)
+    out['mobility'] = round(float(weights['mobility']), 4)
+    with open(fname, 'w') as fout:
+        json.dump(out, fout)
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the Reversi pattern evaluation from self-play.')
+    sub = parser.add_subparsers(dest='command')
+    gen = sub.add_parser('generate', help='append self-play positions to a dataset')
+    gen.add_argument('strategies', nargs='+', help='strategy names: %s' % ', '.join(sorted(engine.STRATEGIES)))
+    gen.add_argument('-n', '--games', type=int, default=1000, help='games to play')
+    gen.add_argument('-o', '--output', default='selfplay.bin', help='dataset file (appended to)')
+    gen.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: all CPUs)')
+    gen.add_argument('-s', '--seed', type=int, default=0, help='base random seed')
+    fitp = sub.add_parser('fit', help='fit pattern weights on a dataset')
+    fitp.add_argument('-d', '--data', default='selfplay.bin', help='dataset file')
+    fitp.add_argument('-e', '--epochs', type=int, default=5)
+    fitp.add_argument('-b', '--batch', type=int, default=4096, help='positions per SGD step')
+    fitp.add_argument('--lr', type=float, default=0.05, help='learning rate')
+    fitp.add_argument('--min-empties', type=int, default=0, help='ignore positions with fewer empty squares')
+    fitp.add_argument('-o', '--output', default=patterns.WEIGHTS_FILE, help='weights file')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.command == 'generate':
+        for name in args.strategies:
+            if name not in engine.STRATEGIES:
+                parser.error('unknown strategy %r' % name)
+        n = generate(args.output, args.strategies, args.games, args.workers, args.seed)
+        print 'Wrote %d positions to %s in %.1f s' %(n, args.output, time.time() - start)
+    else:
+        weights = fit(args.data, args.epochs, args.batch, args.lr, args.min_empties)
+        save_weights(args.output, weights)
+        print 'Saved weights to %s in %.1f s' %(args.output, time.time() - start)
+
+if __name__ == '__main__':
+    main()
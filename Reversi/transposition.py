@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+""" Zobrist hashing and a fixed-size transposition table for Reversi search.
+    Author: Duong Nguyen
+"""
+
+import random
+
+import bitboard
+
+# CONSTANTS
+EXACT = 0 # stored score is the exact value
+LOWER = 1 # stored score is a lower bound (fail high)
+UPPER = 2 # stored score is an upper bound (fail low)
+ENTRY_BYTES = 96 # rough size of one entry (key + tuple) in CPython
+ZOBRIST_SEED = 20130524
+
+# Zobrist keys. A position is hashed from the point of view of the player
+# to move: OWN_KEYS for their discs, OPP_KEYS for the opponent's discs.
+_rng = random.Random(ZOBRIST_SEED)
+OWN_KEYS = [_rng.getrandbits(64) for _ in xrange(64)]
+OPP_KEYS = [_rng.getrandbits(64) for _ in xrange(64)]
+FLIP_KEYS = [a ^ b for a, b in zip(OWN_KEYS, OPP_KEYS)]
+del _rng
+
+def hash_position(own, opp):
+    """ Zobrist keys of a position.
+
+        Returns:
+            (key, swappedKey): key of (own, opp) and of (opp, own).
+            Keeping both lets play_hash() update them incrementally.
+    """
+    key = swapped = 0
+    for sq in bitboard.iter_squares(own):
+        key ^= OWN_KEYS[sq]
+        swapped ^= OPP_KEYS[sq]
+    for sq in bitboard.iter_squares(opp):
+        key ^= OPP_KEYS[sq]
+        swapped ^= OWN_KEYS[sq]
+    return key, swapped
+
+def play_hash(key, swapped, sq, flips):
+    """ Keys after the player to move plays at sq flipping `flips`.
+        The side to move changes, so the result is from the opponent's view.
+    """
+    delta = 0
+    while flips:
+        low = flips & -flips
+        delta ^= FLIP_KEYS[low.bit_length() - 1]
+        flips ^= low
+    return swapped ^ delta ^ OPP_KEYS[sq], key ^ delta ^ OWN_KEYS[sq]
+
+class TranspositionTable(object):
+    """ Fixed-size hash table of search results.
+
+        Each bucket has two slots: a depth-preferred slot that keeps the
+        deepest result seen, and an always-replace slot for the newest one.
+        An entry is (key, depth, flag, score, move).
+
+        Params:
+            sizeMB: memory budget in megabytes.
+    """
+
+    def __init__(self, sizeMB=16):
+        nbuckets = 1
+        while nbuckets * 4 * ENTRY_BYTES <= sizeMB * (1 << 20):
+            nbuckets *= 2
+        self.mask = nbuckets - 1
+        self.deep = [None] * nbuckets
+        self.recent = [None] * nbuckets
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def __len__(self):
+        return sum(e is not None for e in self.deep) + sum(e is not None for e in self.recent)
+
+    def clear(self):
+        """ Drop all entries and reset the counters."""
+        n = self.mask + 1
+        self.deep = [None] * n
+        self.recent = [None] * n
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def probe(self, key):
+        """ Look up a position.
+
+            Returns:
+                (depth, flag, score, move) if the position is stored, None otherwise.
+        """
+        i = key & self.mask
+        e = self.deep[i]
+        if e is not None and e[0] == key:
+            self.hits += 1
+            return e[1:]
+        r = self.recent[i]
+        if r is not None and r[0] == key:
+            self.hits += 1
+            return r[1:]
+        self.misses += 1
+        if e is not None or r is not None: # bucket taken by other positions
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """ Save a search result, keeping the deeper one in the depth-preferred slot."""
+        i = key & self.mask
+        entry = (key, depth, flag, score, move)
+        self.stores += 1
+        e = self.deep[i]
+        if e is None or e[0] == key or depth >= e[1]:
+            self.deep[i] = entry
+        else:
+            self.recent[i] = entry
+
+    def stats(self):
+        """ Counters for sizing the table."""
+        probes = self.hits + self.misses
+        return {'buckets': self.mask + 1,
+                'entries': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'collisions': self.collisions,
+                'stores': self.stores,
+                'hit_rate': round(self.hits * 1. / probes, 4) if probes else 0.}